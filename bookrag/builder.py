@@ -1,12 +1,75 @@
 """Main build logic for converting markdown to web book."""
+import functools
+import gzip
+import hashlib
+import os
+import re
 import subprocess
 import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List
-from jinja2 import Environment, FileSystemLoader, select_autoescape
-from bookrag.config import load_config
-from bookrag.chunker import chunk_markdown
-from bookrag.embeddings import generate_embeddings, check_ollama_available, OllamaConnectionError
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, select_autoescape
+from bookrag.config import load_config, get_cache_dir
+from bookrag.chunker import Chunk, chunk_markdown
+from bookrag.embeddings import (
+    generate_embeddings, load_embedding_cache, pack_chunks,
+    OllamaConnectionError, OllamaOverloadedError
+)
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+_TEMPLATE_DIR = Path(__file__).parent / "templates"
+
+# Markdown whose rendering depends on the rest of the document: footnotes and
+# inline notes are collected at the end, reference definitions are shared
+_DOCUMENT_SCOPED_RE = re.compile(r'\[\^|\^\[|^[ ]{0,3}\[[^\]]+\]:', re.MULTILINE)
+_ATX_HEADING_RE = re.compile(r'^[ ]{0,3}#{1,6}[ \t]+(.*?)(?:[ \t]+#+)?[ \t]*$')
+_SETEXT_UNDERLINE_RE = re.compile(r'^[ ]{0,3}(?:=+|-+)[ \t]*$')
+
+
+def _create_bytecode_cache() -> Optional[FileSystemBytecodeCache]:
+    """Create an on-disk Jinja bytecode cache, or None if it can't be created."""
+    cache_dir = get_cache_dir("jinja")
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        return None
+    return FileSystemBytecodeCache(str(cache_dir))
+
+
+@functools.lru_cache(maxsize=None)
+def _get_jinja_env() -> Environment:
+    """Return the shared Jinja environment, created on first render.
+
+    Shared so compiled templates stay in Jinja's cache across builds; the
+    bytecode cache also skips recompiling book.html on later process starts.
+    Created lazily so importing this module touches nothing on disk.
+    """
+    return Environment(
+        loader=FileSystemLoader(_TEMPLATE_DIR),
+        autoescape=select_autoescape(['html', 'xml']),
+        auto_reload=False,
+        bytecode_cache=_create_bytecode_cache()
+    )
+
+
+# Chat widget markup (AI is mandatory, so every book gets it)
+CHAT_HTML = '''
+    <aside class="chat-widget">
+        <div class="chat-header">AI Assistant</div>
+        <div class="chat-messages" id="chat-messages"></div>
+        <div class="chat-input">
+            <textarea id="user-input" placeholder="Ask a question..."></textarea>
+            <button id="send-btn">Send</button>
+        </div>
+    </aside>
+    '''
+
 
 def generate_toc(chapters: List[Dict[str, str]]) -> str:
     """Generate TOC HTML from chapters list.
@@ -17,41 +80,159 @@ def generate_toc(chapters: List[Dict[str, str]]) -> str:
     Returns:
         HTML string for TOC list items
     """
+    return _render_toc(tuple((chapter["id"], chapter["title"]) for chapter in chapters))
+
+
+@functools.lru_cache(maxsize=8)
+def _render_toc(chapters: Tuple[Tuple[str, str], ...]) -> str:
+    """Render TOC list items for (id, title) pairs, cached across rebuilds."""
     toc_items = []
-    for chapter in chapters:
+    for chapter_id, title in chapters:
         toc_items.append(
-            f'<li><a href="#" data-chapter-id="{chapter["id"]}">{chapter["title"]}</a></li>'
+            f'<li><a href="#" data-chapter-id="{chapter_id}">{title}</a></li>'
         )
     return '\n'.join(toc_items)
 
 
-def build_book(source_dir: Path, output_file: Path):
+def read_chunks_file(chunks_file: Path) -> bytes:
+    """Read chunks JSON bytes from chunks.json or chunks.json.gz.
+
+    Args:
+        chunks_file: Path to a chunks file written by build_book
+
+    Returns:
+        Uncompressed JSON bytes
+    """
+    if chunks_file.suffix == ".gz":
+        with gzip.open(chunks_file, 'rb') as f:
+            return f.read()
+    return chunks_file.read_bytes()
+
+
+def _load_previous_chunks(chunks_file: Path) -> Optional[Tuple[bytes, Any]]:
+    """Read and parse a previous chunks file, or None if missing or unreadable."""
+    try:
+        chunks_json = read_chunks_file(chunks_file)
+        return chunks_json, json.loads(chunks_json)
+    except (OSError, ValueError):
+        return None
+
+
+def chunks_fingerprint(config_path: Path, config: Dict[str, Any], chunks: List[Chunk]) -> str:
+    """Fingerprint the inputs that determine a book's packed chunks.
+
+    Covers the resolved config path, the embedding settings and every chunk
+    as produced by the chunker, so chunks.json written by another book or
+    by a different chunker version never matches.
+
+    Args:
+        config_path: Path to bookrag.yaml
+        config: Validated config dictionary
+        chunks: Chunks of the whole book, in order
+
+    Returns:
+        Hex digest identifying the inputs
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    header = [str(config_path.resolve()), config["embedding_model"], config["quantize"]]
+    digest.update(json.dumps(header).encode("utf-8"))
+    for chunk in chunks:
+        fields = [chunk.id, chunk.chapter_id, chunk.heading, chunk.content, chunk.token_count]
+        digest.update(json.dumps(fields, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _load_fresh_chunks(
+    chunks_file: Path,
+    source_files: List[Path],
+    fingerprint: str
+) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+    """Load a previous chunks file if it is newer than every source file.
+
+    The file must also have been written for the same inputs, see
+    chunks_fingerprint.
+
+    Returns:
+        Tuple of (JSON bytes, parsed data), or None if missing, stale or unreadable
+    """
+    try:
+        chunks_mtime = chunks_file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    if any(path.stat().st_mtime_ns >= chunks_mtime for path in source_files):
+        return None
+
+    previous = _load_previous_chunks(chunks_file)
+
+    # Files written by older versions used a different layout
+    if previous is None or not isinstance(previous[1], dict) or "embeddings" not in previous[1]:
+        return None
+
+    if previous[1].get("fingerprint") != fingerprint:
+        return None
+
+    return previous
+
+
+def dumps_json(data: Any) -> bytes:
+    """Serialize data to compact UTF-8 JSON, using orjson when installed.
+
+    Args:
+        data: JSON-serializable data
+
+    Returns:
+        Encoded JSON bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def wrap_chapters_html(
+    chapters: List[Dict[str, str]],
+    chapter_html_list: List[str]
+) -> Iterator[str]:
+    """Yield each chapter's HTML wrapped in its chapter div.
+
+    Args:
+        chapters: List of chapter dicts with id
+        chapter_html_list: Converted HTML for each chapter, in order
+
+    Yields:
+        HTML string for one chapter div (first chapter gets active class)
+    """
+    for i, (chapter, chapter_html) in enumerate(zip(chapters, chapter_html_list)):
+        active_class = " active" if i == 0 else ""
+        yield (
+            f'<div class="chapter{active_class}" id="chapter-{chapter["id"]}">'
+            f'\n{chapter_html}\n</div>\n'
+        )
+
+
+def build_book(source_dir: Path, output_file: Path, compress_chunks: bool = True):
     """Build web book from markdown source.
 
     Args:
         source_dir: Directory containing bookrag.yaml and chapters
         output_file: Path for output HTML file
+        compress_chunks: Write chunks.json.gz instead of plain chunks.json
 
     Raises:
         FileNotFoundError: If config or chapter files missing
         subprocess.CalledProcessError: If pandoc fails
+        OllamaConnectionError: If Ollama is not running
     """
     # Load and validate config
     config_path = source_dir / "bookrag.yaml"
     config = load_config(config_path)
 
-    # Check Ollama availability
-    if not check_ollama_available():
-        raise OllamaConnectionError(
-            "Ollama is not running. Please start Ollama with: ollama serve\n"
-            "Then ensure you have the embedding model: ollama pull nomic-embed-text"
-        )
-
-    # Process each chapter through pandoc
-    chapters_html = []
+    # Read and chunk each chapter
+    chapter_files = []
+    chapter_markdown = []
     all_chunks = []
 
-    for i, chapter in enumerate(config["chapters"]):
+    for chapter in config["chapters"]:
         chapter_folder = source_dir / chapter["folder"]
         chapter_file = chapter_folder / "content.md"
 
@@ -59,8 +240,7 @@ def build_book(source_dir: Path, output_file: Path):
             raise FileNotFoundError(f"Chapter file not found: {chapter_file}")
 
         # Read markdown content
-        with open(chapter_file, 'r') as f:
-            markdown_content = f.read()
+        markdown_content = chapter_file.read_text(encoding='utf-8')
 
         # Chunk the markdown content
         chapter_chunks = chunk_markdown(
@@ -69,42 +249,66 @@ def build_book(source_dir: Path, output_file: Path):
             max_tokens=500
         )
         all_chunks.extend(chapter_chunks)
+        chapter_files.append(chapter_file)
+        chapter_markdown.append(markdown_content)
 
-        # Convert with pandoc for HTML display
-        chapter_html = convert_markdown_to_html(chapter_file)
+    # Convert with pandoc for HTML display, reusing the markdown already read
+    chapter_html_list = convert_all_markdown_to_html(chapter_markdown)
 
-        # Wrap in chapter div (first chapter gets active class)
-        active_class = " active" if i == 0 else ""
-        wrapped_html = (
-            f'<div class="chapter{active_class}" id="chapter-{chapter["id"]}">'
-            f'\n{chapter_html}\n</div>'
+    # Wrapped lazily so the template streams each chapter straight to disk
+    chapters_html = wrap_chapters_html(config["chapters"], chapter_html_list)
+
+    # Reuse the previous chunks file when no chapter or config changed since
+    # and it was written for exactly these chunks
+    chunks_file = output_file.parent / ("chunks.json.gz" if compress_chunks else "chunks.json")
+    fingerprint = chunks_fingerprint(config_path, config, all_chunks)
+    fresh_chunks = _load_fresh_chunks(chunks_file, [config_path, *chapter_files], fingerprint)
+
+    if fresh_chunks:
+        chunks_json, chunks_data = fresh_chunks
+        print(f"Chunks up to date, reusing embeddings from {chunks_file}")
+    else:
+        # Chunks whose content is unchanged keep their previous embedding
+        previous = _load_previous_chunks(chunks_file)
+        embedding_cache = (
+            load_embedding_cache(previous[1], config["embedding_model"], config["quantize"])
+            if previous else {}
         )
-        chapters_html.append(wrapped_html)
-
-    # Generate embeddings for all chunks
-    print(f"Generating embeddings for {len(all_chunks)} chunks...")
-    chunks_with_embeddings = generate_embeddings(
-        chunks=all_chunks,
-        model=config["embedding_model"],
-        progress_callback=lambda cur, total: print(f"  Embedding {cur}/{total}...")
-    )
-    print("Embeddings complete.")
+
+        # Generate embeddings for all chunks; the first request doubles as the
+        # Ollama availability check
+        print(f"Generating embeddings for {len(all_chunks)} chunks...")
+        if embedding_cache:
+            print(f"  Reusing up to {len(embedding_cache)} embeddings from {chunks_file}")
+        try:
+            chunks_with_embeddings = generate_embeddings(
+                chunks=all_chunks,
+                model=config["embedding_model"],
+                progress_callback=lambda cur, total: print(f"  Embedding {cur}/{total}..."),
+                batch_size=config["embed_batch_size"],
+                quantize=config["quantize"],
+                cache=embedding_cache,
+                cache_dir=get_cache_dir("embeddings")
+            )
+        except OllamaOverloadedError:
+            raise
+        except OllamaConnectionError as e:
+            raise OllamaConnectionError(
+                "Ollama is not running. Please start Ollama with: ollama serve\n"
+                f"Then ensure you have the embedding model: ollama pull {config['embedding_model']}"
+            ) from e
+        print("Embeddings complete.")
+
+        # Convert chunks to serializable format, encoded once for both outputs
+        chunks_data = pack_chunks(
+            chunks_with_embeddings, config["quantize"], config["embedding_model"]
+        )
+        chunks_data["fingerprint"] = fingerprint
+        chunks_json = dumps_json(chunks_data)
 
     # Generate TOC
     toc_html = generate_toc(config["chapters"])
 
-    # Always generate chat widget (AI is mandatory)
-    chat_html = '''
-    <aside class="chat-widget">
-        <div class="chat-header">AI Assistant</div>
-        <div class="chat-messages" id="chat-messages"></div>
-        <div class="chat-input">
-            <textarea id="user-input" placeholder="Ask a question..."></textarea>
-            <button id="send-btn">Send</button>
-        </div>
-    </aside>
-    '''
-
     # Prepare chat config for Ollama
     chat_config = {
         "model": config["model"],
@@ -112,50 +316,148 @@ def build_book(source_dir: Path, output_file: Path):
         "system_prompt": config["system_prompt"],
     }
 
-    # Convert chunks to serializable format
-    chunks_data = [chunk.to_dict() for chunk in chunks_with_embeddings]
-
     # Prepare template variables
     template_vars = {
         "title": config.get("title", "Book"),
         "author": config.get("author", ""),
         "toc_html": toc_html,
-        "chapters_html": "\n".join(chapters_html),
-        "chat_html": chat_html,
-        "chunks_json": json.dumps(chunks_data),
+        "chapters_html": chapters_html,
+        "chat_html": CHAT_HTML,
+        "chunks_json": chunks_json.decode('utf-8'),
         "chat_config_json": json.dumps(chat_config),
     }
 
     # Render template
-    template_dir = Path(__file__).parent / "templates"
-    env = Environment(
-        loader=FileSystemLoader(template_dir),
-        autoescape=select_autoescape(['html', 'xml'])
-    )
-    template = env.get_template("book.html")
-    output_html = template.render(**template_vars)
+    template = _get_jinja_env().get_template("book.html")
 
     # Write output files
     output_file.parent.mkdir(parents=True, exist_ok=True)
 
     # Write HTML
-    with open(output_file, 'w') as f:
-        f.write(output_html)
+    with open(output_file, 'w', encoding='utf-8', buffering=1 << 20) as f:
+        template.stream(**template_vars).dump(f)
 
-    # Write chunks.json alongside HTML
-    chunks_file = output_file.parent / "chunks.json"
-    with open(chunks_file, 'w') as f:
-        json.dump(chunks_data, f)
+    # Write chunks alongside HTML (an up-to-date file is left in place)
+    if not fresh_chunks:
+        if compress_chunks:
+            with gzip.open(chunks_file, 'wb', compresslevel=6) as f:
+                f.write(chunks_json)
+        else:
+            with open(chunks_file, 'wb', buffering=1 << 20) as f:
+                f.write(chunks_json)
 
     print(f"Built: {output_file}")
-    print(f"Chunks: {chunks_file} ({len(chunks_data)} chunks)")
+    print(f"Chunks: {chunks_file} ({len(chunks_data['chunks'])} chunks)")
+
+
+def _heading_ids(markdown_text: str) -> set:
+    """Approximate the identifiers pandoc generates for a chapter's headings.
+
+    Errs towards reporting too many headings (e.g. lines inside code blocks),
+    which only costs an unnecessary per-chapter fallback.
+    """
+    ids = set()
+    previous = ""
+    for line in markdown_text.splitlines():
+        match = _ATX_HEADING_RE.match(line)
+        if match:
+            text = match.group(1)
+        elif _SETEXT_UNDERLINE_RE.match(line) and previous.strip():
+            text = previous
+        else:
+            previous = line
+            continue
+        previous = line
+
+        text = re.sub(r'\{[^}]*\}\s*$', '', text).lower()
+        text = re.sub(r'[^\w\s.-]', '', text)
+        text = re.sub(r'^[\W\d_]+', '', re.sub(r'\s+', '-', text.strip()))
+        ids.add(text or "section")
+    return ids
+
+
+def _needs_separate_conversion(markdown_texts: List[str]) -> bool:
+    """Whether converting chapters as one document could change their HTML.
+
+    True if a chapter uses notes or reference definitions, or if two chapters
+    have headings with the same identifier (pandoc would suffix the later one).
+    """
+    seen_ids = set()
+    for text in markdown_texts:
+        if _DOCUMENT_SCOPED_RE.search(text):
+            return True
+        ids = _heading_ids(text)
+        if ids & seen_ids:
+            return True
+        seen_ids |= ids
+    return False
+
+
+def convert_all_markdown_to_html(markdown_texts: List[str]) -> List[str]:
+    """Convert chapter markdown to HTML with a single pandoc process.
+
+    Chapters are joined with a unique HTML comment sentinel, converted in
+    one pandoc run, and split back apart. Falls back to one pandoc run per
+    chapter when the combined document could render differently (see
+    _needs_separate_conversion) or the sentinel does not survive conversion
+    intact.
+
+    Args:
+        markdown_texts: Markdown content of each chapter
+
+    Returns:
+        HTML strings in the same order as markdown_texts
+
+    Raises:
+        subprocess.CalledProcessError: If pandoc fails
+        FileNotFoundError: If pandoc not installed
+    """
+    if len(markdown_texts) < 2 or _needs_separate_conversion(markdown_texts):
+        return convert_chapters_to_html(markdown_texts)
+
+    sentinel = f"<!--BOOKRAG_SPLIT_{uuid.uuid4().hex}-->"
+    combined = f"\n\n{sentinel}\n\n".join(markdown_texts)
+    html = convert_markdown_to_html(combined)
+
+    parts = html.split(sentinel)
+    if len(parts) != len(markdown_texts):
+        return convert_chapters_to_html(markdown_texts)
+
+    return [part.strip("\n") + "\n" for part in parts]
+
+
+def convert_chapters_to_html(markdown_texts: List[str]) -> List[str]:
+    """Convert chapter markdown to HTML, running pandoc in parallel.
+
+    Pandoc must be installed; if it is missing the FileNotFoundError from
+    the first conversion is raised.
+
+    Args:
+        markdown_texts: Markdown content of each chapter
+
+    Returns:
+        HTML strings in the same order as markdown_texts
+
+    Raises:
+        subprocess.CalledProcessError: If pandoc fails
+        FileNotFoundError: If pandoc not installed
+    """
+    if not markdown_texts:
+        return []
+
+    max_workers = min(8, os.cpu_count() or 1, len(markdown_texts))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(convert_markdown_to_html, markdown_texts))
+
 
+def convert_markdown_to_html(markdown_text: str) -> str:
+    """Convert markdown text to HTML using pandoc.
 
-def convert_markdown_to_html(markdown_file: Path) -> str:
-    """Convert markdown file to HTML using pandoc.
+    The markdown is piped to pandoc on stdin, so callers that already hold
+    the chapter in memory don't make pandoc read the file again.
 
     Args:
-        markdown_file: Path to markdown file
+        markdown_text: Markdown content
 
     Returns:
         HTML string (body content only, not standalone)
@@ -166,9 +468,11 @@ def convert_markdown_to_html(markdown_file: Path) -> str:
     """
     try:
         result = subprocess.run(
-            ["pandoc", str(markdown_file), "-f", "markdown", "-t", "html"],
+            ["pandoc", "-f", "markdown", "-t", "html"],
+            input=markdown_text,
             capture_output=True,
             text=True,
+            encoding='utf-8',
             check=True
         )
         return result.stdout
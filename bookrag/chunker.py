@@ -1,7 +1,25 @@
 """Chunk markdown content for RAG retrieval."""
+import hashlib
+import os
 import re
+import tempfile
 from dataclasses import dataclass
-from typing import List
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; fall back to a length heuristic
+    tiktoken = None
+
+# A ## or ### heading line
+_HEADING_RE = re.compile(r'#{2,3}[ \t]+(.+)$')
+# Whitespace following sentence-ending punctuation
+_SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+')
+
+# Where tiktoken downloads cl100k_base from; its cache file is named by the URL's sha1
+_CL100K_BASE_URL = "https://openaipublic.blob.core.windows.net/encodings/cl100k_base.tiktoken"
 
 
 @dataclass
@@ -14,9 +32,110 @@ class Chunk:
     token_count: int
 
 
+def _tiktoken_cache_file() -> Optional[Path]:
+    """Return where tiktoken caches cl100k_base, or None if caching is disabled."""
+    if "TIKTOKEN_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["TIKTOKEN_CACHE_DIR"]
+    elif "DATA_GYM_CACHE_DIR" in os.environ:
+        cache_dir = os.environ["DATA_GYM_CACHE_DIR"]
+    else:
+        cache_dir = os.path.join(tempfile.gettempdir(), "data-gym-cache")
+    if not cache_dir:
+        return None
+    return Path(cache_dir, hashlib.sha1(_CL100K_BASE_URL.encode()).hexdigest())
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Load the cl100k_base tokenizer, or None if tiktoken can't be used offline.
+
+    tiktoken downloads the encoding on first use. It is only loaded when
+    already cached locally, so chunk boundaries (and the content hashes
+    that embedding reuse relies on) never depend on network access.
+    """
+    if tiktoken is None:
+        return None
+
+    cache_file = _tiktoken_cache_file()
+    if cache_file is None or not cache_file.is_file():
+        print(
+            "tiktoken's cl100k_base encoding is not cached; estimating tokens instead. "
+            "Fetch it once with: python -c \"import tiktoken; tiktoken.get_encoding('cl100k_base')\""
+        )
+        return None
+
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"Could not load tiktoken's cl100k_base encoding ({e}); estimating tokens instead.")
+        return None
+
+
 def estimate_tokens(text: str) -> int:
-    """Estimate token count (roughly 4 chars per token)."""
-    return len(text) // 4
+    """Count tokens with tiktoken, or estimate roughly 4 chars per token."""
+    encoder = _get_encoder()
+    if encoder is None:
+        return len(text) // 4
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def _split_sections(content: str) -> List[Tuple[str, str, List[str]]]:
+    """Split markdown into heading sections in a single pass over its lines.
+
+    Content before the first heading becomes an "Introduction" section.
+    Sections under a heading with no content are dropped.
+
+    Args:
+        content: Markdown content to split
+
+    Returns:
+        List of (heading, section_content, paragraphs) tuples
+    """
+    sections = []
+    heading = None
+    section_lines = []
+    paragraphs = []
+    paragraph_lines = []
+
+    def end_paragraph():
+        paragraph = ''.join(paragraph_lines).strip()
+        if paragraph:
+            paragraphs.append(paragraph)
+        paragraph_lines.clear()
+
+    def end_section():
+        end_paragraph()
+        section_content = ''.join(section_lines).strip()
+        if section_content:
+            sections.append((
+                "Introduction" if heading is None else heading,
+                section_content,
+                list(paragraphs)
+            ))
+        section_lines.clear()
+        paragraphs.clear()
+
+    for line in content.splitlines(keepends=True):
+        if line.startswith('##'):
+            match = _HEADING_RE.match(line)
+            if match:
+                end_section()
+                heading = match.group(1).strip()
+                continue
+
+        section_lines.append(line)
+        if line.strip():
+            paragraph_lines.append(line)
+        else:
+            end_paragraph()
+
+    if heading is None:
+        # No headings - treat entire content as one section
+        end_paragraph()
+        return [("", ''.join(section_lines).strip(), list(paragraphs))]
+
+    end_section()
+    return sections
 
 
 def chunk_markdown(
@@ -39,42 +158,18 @@ def chunk_markdown(
     """
     chunks = []
     chunk_counter = 0
+    token_counts = {}
 
-    # Split by headings (## or ###)
-    # Pattern captures the heading line and everything until the next heading
-    heading_pattern = r'^(#{2,3})\s+(.+?)$'
-
-    # Find all headings and their positions
-    headings = list(re.finditer(heading_pattern, content, re.MULTILINE))
-
-    if not headings:
-        # No headings - treat entire content as one section
-        sections = [("", content.strip())]
-    else:
-        sections = []
-
-        # Content before first heading
-        first_heading_pos = headings[0].start()
-        if first_heading_pos > 0:
-            intro_content = content[:first_heading_pos].strip()
-            if intro_content:
-                sections.append(("Introduction", intro_content))
-
-        # Process each heading and its content
-        for i, match in enumerate(headings):
-            heading_text = match.group(2).strip()
-
-            # Get content between this heading and the next (or end)
-            start = match.end()
-            end = headings[i + 1].start() if i + 1 < len(headings) else len(content)
-            section_content = content[start:end].strip()
-
-            if section_content:
-                sections.append((heading_text, section_content))
+    def count_tokens(text: str) -> int:
+        # Memoized per call: repeated paragraphs and single-paragraph
+        # sections are only tokenized once
+        if text not in token_counts:
+            token_counts[text] = estimate_tokens(text)
+        return token_counts[text]
 
     # Process each section
-    for heading, section_content in sections:
-        section_tokens = estimate_tokens(section_content)
+    for heading, section_content, paragraphs in _split_sections(content):
+        section_tokens = count_tokens(section_content)
 
         if section_tokens <= max_tokens:
             # Section fits in one chunk
@@ -88,16 +183,11 @@ def chunk_markdown(
             ))
         else:
             # Section too large - split by paragraphs
-            paragraphs = re.split(r'\n\n+', section_content)
             current_chunk_parts = []
             current_tokens = 0
 
             for para in paragraphs:
-                para = para.strip()
-                if not para:
-                    continue
-
-                para_tokens = estimate_tokens(para)
+                para_tokens = count_tokens(para)
 
                 if current_tokens + para_tokens > max_tokens and current_chunk_parts:
                     # Save current chunk
@@ -115,12 +205,12 @@ def chunk_markdown(
                 # Handle very long paragraphs (> max_tokens)
                 if para_tokens > max_tokens:
                     # Split by sentences as last resort
-                    sentences = re.split(r'(?<=[.!?])\s+', para)
+                    sentences = _SENTENCE_BREAK_RE.split(para)
                     for sentence in sentences:
                         sentence = sentence.strip()
                         if not sentence:
                             continue
-                        sent_tokens = estimate_tokens(sentence)
+                        sent_tokens = count_tokens(sentence)
 
                         if current_tokens + sent_tokens > max_tokens and current_chunk_parts:
                             chunk_counter += 1
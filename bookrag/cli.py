@@ -2,7 +2,6 @@
 import click
 import subprocess
 from pathlib import Path
-from bookrag.builder import build_book
 
 @click.group()
 @click.version_option()
@@ -13,16 +12,23 @@ def cli():
 @cli.command()
 @click.argument('source_dir', type=click.Path(exists=True, file_okay=False, path_type=Path))
 @click.argument('output_file', type=click.Path(path_type=Path))
-def build(source_dir: Path, output_file: Path):
+@click.option('--gzip/--no-gzip', 'compress_chunks', default=True,
+              help='Write chunks.json.gz (default) or uncompressed chunks.json.')
+def build(source_dir: Path, output_file: Path, compress_chunks: bool):
     """Build a web book from markdown source.
 
     SOURCE_DIR: Directory containing bookrag.yaml and chapter folders
     OUTPUT_FILE: Path for the generated HTML file
     """
+    # Imported here so --help and usage errors don't load requests, jinja2, etc.
+    from bookrag.builder import build_book
+    from bookrag.embeddings import OllamaConnectionError
+
     try:
-        build_book(source_dir, output_file)
+        build_book(source_dir, output_file, compress_chunks=compress_chunks)
         click.echo(f"✓ Book built successfully: {output_file}")
-    except (FileNotFoundError, ValueError, subprocess.CalledProcessError) as e:
+    except (FileNotFoundError, ValueError, subprocess.CalledProcessError,
+            OllamaConnectionError) as e:
         click.echo(f"✗ Error: {e}", err=True)
         raise click.Abort()
 
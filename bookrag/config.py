@@ -1,11 +1,100 @@
 """Configuration file parsing and validation."""
+import copy
+import hashlib
+import json
+import os
 import yaml
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, Tuple
+
+try:
+    from yaml import CSafeLoader as _Loader
+except ImportError:  # PyYAML built without libyaml
+    from yaml import SafeLoader as _Loader
+
+DEFAULT_EMBED_BATCH_SIZE = 32
+MAX_EMBED_BATCH_SIZE = 512
+QUANTIZE_MODES = ("none", "fp16", "int8")
+
+# Required top-level fields, in the order they are reported when missing
+# (the AI fields are required because bookrag is Ollama-only in v1)
+REQUIRED_FIELDS = ("title", "chapters", "model", "embedding_model", "system_prompt")
+REQUIRED_CHAPTER_FIELDS = ("id", "title", "folder")
+
+# Validated configs keyed by (resolved path, mtime_ns, size); edits change the key
+_CONFIG_CACHE: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+
+# On-disk cache entries are also tied to this module, so changes to the
+# validation code invalidate configs validated by an older version
+_VALIDATOR_STAMP = Path(__file__).stat().st_mtime_ns
+
+
+def get_cache_dir(*parts: str) -> Path:
+    """Return a bookrag cache directory under the user's cache home.
+
+    Honors XDG_CACHE_HOME, defaulting to ~/.cache. The directory is not created.
+
+    Args:
+        parts: Optional subdirectory names below the bookrag cache root
+
+    Returns:
+        Path to the cache directory
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home, "bookrag", *parts)
+
+
+def _disk_cache_path(cache_key: Tuple[str, int, int]) -> Path:
+    """Return the on-disk cache file for a config's resolved path."""
+    key = hashlib.sha256(cache_key[0].encode("utf-8")).hexdigest()
+    return get_cache_dir("config") / f"{key}.json"
+
+
+def _read_disk_cache(cache_key: Tuple[str, int, int]) -> Any:
+    """Return the validated config stored for cache_key, or None.
+
+    Unreadable or malformed cache files are treated as a miss.
+    """
+    try:
+        entry = json.loads(_disk_cache_path(cache_key).read_bytes())
+        if entry["key"] != [*cache_key, _VALIDATOR_STAMP]:
+            return None
+        config = entry["config"]
+    except (OSError, ValueError, TypeError, KeyError):
+        return None
+    return config if isinstance(config, dict) else None
+
+
+def _write_disk_cache(cache_key: Tuple[str, int, int], config: Dict[str, Any]) -> None:
+    """Store a validated config on disk as JSON; failures are ignored.
+
+    Configs holding values JSON can't round-trip (e.g. YAML dates) are not
+    cached, so the cache never returns something YAML parsing would not.
+    """
+    try:
+        encoded = json.dumps({"key": [*cache_key, _VALIDATOR_STAMP], "config": config})
+    except (TypeError, ValueError):
+        return
+    if json.loads(encoded)["config"] != config:
+        return
+
+    path = _disk_cache_path(cache_key)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_text(encoded, encoding="utf-8")
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+
 
 def load_config(config_path: Path) -> Dict[str, Any]:
     """Load and validate configuration file.
 
+    Repeated loads of an unchanged file return a copy of the cached result.
+    Validated configs are also cached under get_cache_dir("config"), so a
+    new process skips YAML parsing until the file changes.
+
     Args:
         config_path: Path to bookrag.yaml config file
 
@@ -16,34 +105,52 @@ def load_config(config_path: Path) -> Dict[str, Any]:
         FileNotFoundError: If config file doesn't exist
         ValueError: If required fields are missing or invalid
     """
-    if not config_path.exists():
+    try:
+        st = config_path.stat()
+    except FileNotFoundError:
         raise FileNotFoundError(f"Config file not found: {config_path}")
 
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
+    cache_key = (str(config_path.resolve()), st.st_mtime_ns, st.st_size)
+    if cache_key in _CONFIG_CACHE:
+        return copy.deepcopy(_CONFIG_CACHE[cache_key])
 
-    # Validate required fields
-    if not config.get("title"):
-        raise ValueError("Missing required field: title")
+    config = _read_disk_cache(cache_key)
+    if config is None:
+        config = _parse_config(config_path)
+        _write_disk_cache(cache_key, config)
+    _CONFIG_CACHE[cache_key] = config
+    return copy.deepcopy(config)
 
-    if not config.get("chapters"):
-        raise ValueError("Missing required field: chapters")
 
-    # Validate required AI fields (Ollama-only in v1)
-    if not config.get("model"):
-        raise ValueError("Missing required field: model")
-    if not config.get("embedding_model"):
-        raise ValueError("Missing required field: embedding_model")
-    if not config.get("system_prompt"):
-        raise ValueError("Missing required field: system_prompt")
+def _parse_config(config_path: Path) -> Dict[str, Any]:
+    """Parse and validate a config file without consulting the cache."""
+    # Hand libyaml the raw bytes; it detects UTF-8/UTF-16 itself, so there is
+    # no separate decode step and no dependence on the locale encoding
+    with open(config_path, 'rb') as f:
+        config = yaml.load(f, Loader=_Loader)
+
+    # Validate required fields
+    for field in REQUIRED_FIELDS:
+        if not config.get(field):
+            raise ValueError(f"Missing required field: {field}")
 
     # Validate chapters structure
     for i, chapter in enumerate(config["chapters"]):
-        if not chapter.get("id"):
-            raise ValueError(f"Chapter {i}: missing required field 'id'")
-        if not chapter.get("title"):
-            raise ValueError(f"Chapter {i}: missing required field 'title'")
-        if not chapter.get("folder"):
-            raise ValueError(f"Chapter {i}: missing required field 'folder'")
+        for field in REQUIRED_CHAPTER_FIELDS:
+            if not chapter.get(field):
+                raise ValueError(f"Chapter {i}: missing required field '{field}'")
+
+    # Validate optional embedding batch size, clamped to a sane range
+    batch_size = config.get("embed_batch_size", DEFAULT_EMBED_BATCH_SIZE)
+    if not isinstance(batch_size, int) or isinstance(batch_size, bool):
+        raise ValueError("Field 'embed_batch_size' must be an integer")
+    config["embed_batch_size"] = max(1, min(batch_size, MAX_EMBED_BATCH_SIZE))
+
+    # Validate optional embedding precision
+    quantize = config.setdefault("quantize", "none")
+    if quantize not in QUANTIZE_MODES:
+        raise ValueError(
+            f"Field 'quantize' must be one of: {', '.join(QUANTIZE_MODES)}"
+        )
 
     return config
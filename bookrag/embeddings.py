@@ -1,8 +1,46 @@
 """Generate embeddings via Ollama for RAG retrieval."""
+import atexit
+import base64
+import hashlib
+import math
+import os
+import struct
+import sys
 import requests
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dataclasses import dataclass
-from typing import List
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bookrag.chunker import Chunk
+from bookrag.config import QUANTIZE_MODES
+
+
+def _create_session() -> requests.Session:
+    """Create an HTTP session that keeps connections to Ollama alive."""
+    session = requests.Session()
+    # pool_maxsize must cover generate_embeddings' max_concurrency, otherwise
+    # urllib3 discards the extra connections instead of keeping them alive
+    adapter = HTTPAdapter(
+        pool_connections=8,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=[502, 503, 504],
+            raise_on_status=False
+        )
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Shared across all Ollama calls so TCP connections are reused between requests
+_SESSION = _create_session()
+atexit.register(_SESSION.close)
 
 
 @dataclass
@@ -13,18 +51,235 @@ class ChunkWithEmbedding:
     heading: str
     content: str
     token_count: int
-    embedding: List[float]
+    # Typed array from quantize_embedding (4 or 1 bytes per value); any
+    # sequence of numbers is accepted
+    embedding: Sequence[float]
+    scale: Optional[float] = None
 
-    def to_dict(self) -> dict:
-        """Convert to dictionary for JSON serialization."""
-        return {
+    def metadata(self) -> dict:
+        """Convert everything except the embedding to a dictionary."""
+        data = {
             "id": self.id,
             "chapter_id": self.chapter_id,
             "heading": self.heading,
             "content": self.content,
-            "token_count": self.token_count,
-            "embedding": self.embedding
+            "content_hash": content_hash(self.content),
+            "token_count": self.token_count
         }
+        if self.scale is not None:
+            data["scale"] = self.scale
+        return data
+
+    def to_dict(self) -> dict:
+        """Convert to dictionary for JSON serialization."""
+        data = self.metadata()
+        data["embedding"] = list(self.embedding)
+        return data
+
+
+# Stored embeddings keyed by content hash: (values, int8 scale or None)
+EmbeddingCache = Dict[str, Tuple[Sequence[float], Optional[float]]]
+
+
+def content_hash(text: str) -> str:
+    """Return a short, stable hash of chunk content for embedding reuse."""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def normalize_embedding(embedding: List[float]) -> List[float]:
+    """Scale an embedding to unit length (zero vectors are returned as-is).
+
+    Args:
+        embedding: Embedding vector
+
+    Returns:
+        Unit-length embedding vector
+    """
+    norm = math.sqrt(math.fsum(x * x for x in embedding))
+    if norm == 0:
+        return list(embedding)
+    return [x / norm for x in embedding]
+
+
+def quantize_embedding(
+    embedding: Sequence[float],
+    mode: str = "none"
+) -> Tuple[array, Optional[float]]:
+    """Normalize an embedding and reduce its precision for serialization.
+
+    Vectors are always stored unit-normalized, so readers can use a plain
+    dot product as cosine similarity.
+
+    Args:
+        embedding: Embedding vector
+        mode: "none", "fp16" (half precision) or "int8" (8-bit integers)
+
+    Returns:
+        Tuple of (values, scale). values is an array('f') of float32, or
+        array('b') for int8; multiply int8 values by scale to recover the
+        vector. scale is None for the other modes.
+
+    Raises:
+        ValueError: If mode is unknown
+    """
+    if mode not in QUANTIZE_MODES:
+        raise ValueError(f"Unknown quantize mode: {mode}")
+
+    unit = normalize_embedding(embedding)
+    if mode == "none":
+        return array("f", unit), None
+
+    if mode == "fp16":
+        # array has no half-precision type; keep the rounded values as float32
+        count = len(unit)
+        return array("f", struct.unpack(f"<{count}e", struct.pack(f"<{count}e", *unit))), None
+
+    max_abs = max((abs(x) for x in unit), default=0.0) or 1.0
+    scale = max_abs / 127
+    return array("b", [round(x / scale) for x in unit]), scale
+
+
+# Packed element type and struct format for each quantize mode
+EMBEDDING_DTYPES = {
+    "none": ("float32", "f"),
+    "fp16": ("float16", "e"),
+    "int8": ("int8", "b"),
+}
+
+
+def _pack_embedding(embedding: Sequence[float], code: str) -> bytes:
+    """Pack one embedding as little-endian values of the given struct format."""
+    if isinstance(embedding, array) and embedding.typecode == code:
+        if sys.byteorder == "little":
+            return embedding.tobytes()
+        swapped = array(code, embedding)
+        swapped.byteswap()
+        return swapped.tobytes()
+    return struct.pack(f"<{len(embedding)}{code}", *embedding)
+
+
+def pack_chunks(
+    chunks: List[ChunkWithEmbedding],
+    quantize: str = "none",
+    model: Optional[str] = None
+) -> dict:
+    """Serialize chunks as metadata plus one packed embedding buffer.
+
+    Embeddings are stored row-major in a single little-endian buffer,
+    base64-encoded, so readers can view all vectors as one typed array
+    instead of parsing a JSON list per chunk.
+
+    Args:
+        chunks: Chunks with embeddings, all of the same dimension
+        quantize: Quantize mode the embeddings were produced with
+        model: Embedding model that produced the vectors
+
+    Returns:
+        Dict with "model", "dim", "dtype", "chunks" (metadata without
+        embeddings) and "embeddings" (base64 buffer of len(chunks) * dim values)
+    """
+    dtype, code = EMBEDDING_DTYPES[quantize]
+    dim = len(chunks[0].embedding) if chunks else 0
+    meta = []
+    rows = []
+
+    for chunk in chunks:
+        if len(chunk.embedding) != dim:
+            raise ValueError(
+                f"Chunk {chunk.id} has embedding dimension {len(chunk.embedding)}, expected {dim}"
+            )
+        meta.append(chunk.metadata())
+        rows.append(_pack_embedding(chunk.embedding, code))
+
+    return {
+        "model": model,
+        "dim": dim,
+        "dtype": dtype,
+        "chunks": meta,
+        "embeddings": base64.b64encode(b"".join(rows)).decode("ascii"),
+    }
+
+
+def load_embedding_cache(data: dict, model: str, quantize: str = "none") -> EmbeddingCache:
+    """Recover reusable embeddings from previously packed chunks.
+
+    Only data produced by the same model and quantize mode is reused.
+
+    Args:
+        data: Output of pack_chunks, e.g. a previous chunks.json
+        model: Embedding model of the current build
+        quantize: Quantize mode of the current build
+
+    Returns:
+        Mapping of content hash to (values, scale); empty if nothing is reusable
+    """
+    dtype, code = EMBEDDING_DTYPES[quantize]
+    if not isinstance(data, dict) or data.get("model") != model or data.get("dtype") != dtype:
+        return {}
+
+    try:
+        dim = data["dim"]
+        raw = base64.b64decode(data["embeddings"])
+        values = struct.unpack(f"<{len(data['chunks']) * dim}{code}", raw)
+    except (KeyError, TypeError, ValueError, struct.error):
+        return {}
+
+    typecode = "b" if quantize == "int8" else "f"
+    cache = {}
+    for i, meta in enumerate(data["chunks"]):
+        if "content_hash" in meta:
+            row = array(typecode, values[i * dim:(i + 1) * dim])
+            cache[meta["content_hash"]] = (row, meta.get("scale"))
+    return cache
+
+
+def _disk_cache_path(cache_dir: Path, model: str, text: str) -> Path:
+    """Return the on-disk cache file for a model's embedding of text."""
+    key = hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+    return cache_dir / key[:2] / f"{key[2:]}.f32"
+
+
+def read_cached_embedding(cache_dir: Path, model: str, text: str) -> Optional[List[float]]:
+    """Read a raw Ollama embedding from the on-disk cache.
+
+    Args:
+        cache_dir: Cache directory, e.g. get_cache_dir("embeddings")
+        model: Embedding model that produced the vector
+        text: Embedded text
+
+    Returns:
+        The stored float32 vector, or None if it is not cached
+    """
+    try:
+        raw = _disk_cache_path(cache_dir, model, text).read_bytes()
+    except OSError:
+        return None
+    if not raw or len(raw) % 4:
+        return None
+    values = array("f")
+    values.frombytes(raw)
+    return values.tolist()
+
+
+def write_cached_embedding(cache_dir: Path, model: str, text: str, embedding: List[float]) -> None:
+    """Store a raw Ollama embedding in the on-disk cache as float32.
+
+    Failures are ignored; the cache only saves Ollama calls on later builds.
+
+    Args:
+        cache_dir: Cache directory, e.g. get_cache_dir("embeddings")
+        model: Embedding model that produced the vector
+        text: Embedded text
+        embedding: Embedding vector
+    """
+    path = _disk_cache_path(cache_dir, model, text)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path.write_bytes(array("f", embedding).tobytes())
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
 
 
 class OllamaConnectionError(Exception):
@@ -32,42 +287,67 @@ class OllamaConnectionError(Exception):
     pass
 
 
-def generate_embedding(
-    text: str,
-    model: str = "nomic-embed-text",
-    base_url: str = "http://localhost:11434"
-) -> List[float]:
-    """Generate embedding for a single text using Ollama.
+class OllamaOverloadedError(OllamaConnectionError):
+    """Raised when Ollama times out or fails with a server error."""
+    pass
 
-    Args:
-        text: Text to embed
-        model: Ollama embedding model (default: nomic-embed-text)
-        base_url: Ollama server URL
 
-    Returns:
-        Embedding vector as list of floats
+class OllamaEndpointNotFoundError(ValueError):
+    """Raised when the Ollama server does not provide an API endpoint."""
+    pass
+
+
+def _is_model_not_found(response: requests.Response) -> bool:
+    """Whether a 404 is Ollama's JSON "model not found" error.
+
+    Servers that lack an endpoint answer with a plain-text 404 instead.
+    """
+    try:
+        error = response.json().get("error", "")
+    except (ValueError, AttributeError):
+        return False
+    return isinstance(error, str) and "not found" in error
+
+
+def _post_embed_request(
+    url: str,
+    payload: dict,
+    model: str,
+    base_url: str,
+    timeout: int
+) -> dict:
+    """POST an embedding request to Ollama and return the decoded JSON body.
 
     Raises:
         OllamaConnectionError: If Ollama is not running
-        ValueError: If embedding generation fails
+        OllamaOverloadedError: If Ollama times out or returns a 5xx status
+        OllamaEndpointNotFoundError: If the server does not provide the endpoint
+        ValueError: If the model is missing or the request fails
     """
     try:
-        response = requests.post(
-            f"{base_url}/api/embeddings",
-            json={"model": model, "prompt": text},
-            timeout=30
-        )
+        response = _SESSION.post(url, json=payload, timeout=timeout)
     except requests.ConnectionError:
         raise OllamaConnectionError(
             f"Cannot connect to Ollama at {base_url}. "
             "Please ensure Ollama is running: ollama serve"
         )
     except requests.Timeout:
-        raise OllamaConnectionError(
+        raise OllamaOverloadedError(
             f"Timeout connecting to Ollama at {base_url}. "
             "The embedding model may be loading - try again."
         )
 
+    if response.status_code >= 500:
+        raise OllamaOverloadedError(
+            f"Ollama embedding failed: {response.status_code} {response.text}"
+        )
+
+    if response.status_code == 404 and not _is_model_not_found(response):
+        raise OllamaEndpointNotFoundError(
+            f"Ollama at {base_url} does not support {url}. "
+            "Please upgrade Ollama."
+        )
+
     if response.status_code == 404:
         raise ValueError(
             f"Embedding model '{model}' not found. "
@@ -79,26 +359,146 @@ def generate_embedding(
             f"Ollama embedding failed: {response.status_code} {response.text}"
         )
 
-    data = response.json()
+    return response.json()
+
+
+def generate_embedding(
+    text: str,
+    model: str = "nomic-embed-text",
+    base_url: str = "http://localhost:11434"
+) -> List[float]:
+    """Generate embedding for a single text using Ollama.
+
+    Args:
+        text: Text to embed
+        model: Ollama embedding model (default: nomic-embed-text)
+        base_url: Ollama server URL
+
+    Returns:
+        Embedding vector as list of floats
+
+    Raises:
+        OllamaConnectionError: If Ollama is not running
+        ValueError: If embedding generation fails
+    """
+    data = _post_embed_request(
+        f"{base_url}/api/embeddings",
+        {"model": model, "prompt": text},
+        model,
+        base_url,
+        timeout=30
+    )
     if "embedding" not in data:
         raise ValueError(f"Invalid Ollama response: {data}")
 
     return data["embedding"]
 
 
+def generate_embeddings_batch(
+    texts: List[str],
+    model: str = "nomic-embed-text",
+    base_url: str = "http://localhost:11434"
+) -> List[List[float]]:
+    """Generate embeddings for several texts in one Ollama request.
+
+    Uses the batched /api/embed endpoint. Older Ollama servers that lack it
+    or do not return an "embeddings" list fall back to one /api/embeddings
+    call per text.
+
+    Args:
+        texts: Texts to embed
+        model: Ollama embedding model (default: nomic-embed-text)
+        base_url: Ollama server URL
+
+    Returns:
+        Embedding vectors, in the same order as texts
+
+    Raises:
+        OllamaConnectionError: If Ollama is not running
+        ValueError: If embedding generation fails
+    """
+    try:
+        data = _post_embed_request(
+            f"{base_url}/api/embed",
+            {"model": model, "input": texts},
+            model,
+            base_url,
+            timeout=60
+        )
+    except OllamaEndpointNotFoundError:
+        data = {}
+
+    if "embeddings" not in data:
+        return [generate_embedding(text, model, base_url) for text in texts]
+
+    if len(data["embeddings"]) != len(texts):
+        raise ValueError(
+            f"Ollama returned {len(data['embeddings'])} embeddings "
+            f"for {len(texts)} inputs"
+        )
+
+    return data["embeddings"]
+
+
+def _embed_with_backoff(
+    texts: List[str],
+    model: str,
+    base_url: str
+) -> Tuple[List[List[float]], Optional[int]]:
+    """Embed texts, halving the batch whenever Ollama is overloaded.
+
+    Returns:
+        Tuple of (embedding vectors, smallest batch size that succeeded after
+        a split), with None as the size if the whole batch succeeded at once
+
+    Raises:
+        OllamaOverloadedError: If a single text still cannot be embedded
+    """
+    try:
+        return generate_embeddings_batch(texts, model, base_url), None
+    except OllamaOverloadedError:
+        if len(texts) == 1:
+            raise
+
+    mid = len(texts) // 2
+    left, left_size = _embed_with_backoff(texts[:mid], model, base_url)
+    right, right_size = _embed_with_backoff(texts[mid:], model, base_url)
+    return left + right, min(left_size or mid, right_size or len(texts) - mid)
+
+
 def generate_embeddings(
     chunks: List[Chunk],
     model: str = "nomic-embed-text",
     base_url: str = "http://localhost:11434",
-    progress_callback=None
+    progress_callback=None,
+    batch_size: int = 32,
+    quantize: str = "none",
+    max_concurrency: int = 4,
+    cache: Optional[EmbeddingCache] = None,
+    cache_dir: Optional[Path] = None
 ) -> List[ChunkWithEmbedding]:
     """Generate embeddings for all chunks using Ollama.
 
+    Chunks with identical content are embedded once, and chunks whose
+    content hash is in cache reuse the stored vector. With cache_dir set,
+    raw vectors are also looked up in and saved to an on-disk cache keyed by
+    model and text, shared across books and builds. Texts are sent to
+    Ollama in batches of batch_size texts per request, with up to
+    max_concurrency requests in flight. A batch that times out or hits a
+    server error is split in half and retried, and later batches use the
+    reduced size.
+
     Args:
         chunks: List of Chunk objects to embed
         model: Ollama embedding model (default: nomic-embed-text)
         base_url: Ollama server URL
-        progress_callback: Optional callback(current, total) for progress
+        progress_callback: Optional callback(current, total) for progress,
+            counted in texts sent to Ollama
+        batch_size: Number of chunks per Ollama request (default 32)
+        quantize: Embedding precision, see quantize_embedding (default "none")
+        max_concurrency: Maximum concurrent Ollama requests (default 4)
+        cache: Optional embeddings from a previous build, see load_embedding_cache
+        cache_dir: Optional on-disk cache directory, see read_cached_embedding
 
     Returns:
         List of ChunkWithEmbedding objects
@@ -107,22 +507,74 @@ def generate_embeddings(
         OllamaConnectionError: If Ollama is not running
         ValueError: If embedding generation fails
     """
-    result = []
+    # Embed each distinct text once; repeated boilerplate shares a vector and
+    # unchanged chunks reuse the vector from the previous build or disk cache
+    cache = cache or {}
+    vectors = []
+    text_slots = {}
+    chunk_slots = []
+    texts_to_embed = []
+    embed_slots = []
+    for chunk in chunks:
+        key = content_hash(chunk.content)
+        if key not in text_slots:
+            text_slots[key] = len(vectors)
+            stored = None
+            if key in cache:
+                stored = cache[key]
+            elif cache_dir is not None:
+                raw = read_cached_embedding(cache_dir, model, chunk.content)
+                if raw is not None:
+                    stored = quantize_embedding(raw, quantize)
+            vectors.append(stored)
+            if stored is None:
+                texts_to_embed.append(chunk.content)
+                embed_slots.append(text_slots[key])
+        chunk_slots.append(text_slots[key])
 
-    for i, chunk in enumerate(chunks):
-        if progress_callback:
-            progress_callback(i + 1, len(chunks))
+    embedded_count = 0
+    stable_batch_size = batch_size
+    next_start = 0
+    pending = {}
 
-        embedding = generate_embedding(chunk.content, model, base_url)
+    # Keep up to max_concurrency batches in flight so Ollama can start on the
+    # next batch while the previous response is still being transferred
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        while next_start < len(texts_to_embed) or pending:
+            while next_start < len(texts_to_embed) and len(pending) < max_concurrency:
+                batch = texts_to_embed[next_start:next_start + stable_batch_size]
+                future = executor.submit(_embed_with_backoff, batch, model, base_url)
+                pending[future] = next_start
+                next_start += len(batch)
 
-        result.append(ChunkWithEmbedding(
-            id=chunk.id,
-            chapter_id=chunk.chapter_id,
-            heading=chunk.heading,
-            content=chunk.content,
-            token_count=chunk.token_count,
-            embedding=embedding
-        ))
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                start = pending.pop(future)
+                embeddings, succeeded_size = future.result()
+                # Only an actual split lowers the size; a short final batch does not
+                if succeeded_size is not None:
+                    stable_batch_size = min(stable_batch_size, succeeded_size)
+                for offset, embedding in enumerate(embeddings):
+                    vectors[embed_slots[start + offset]] = quantize_embedding(embedding, quantize)
+                    if cache_dir is not None:
+                        write_cached_embedding(
+                            cache_dir, model, texts_to_embed[start + offset], embedding
+                        )
+                embedded_count += len(embeddings)
+
+                if progress_callback:
+                    progress_callback(embedded_count, len(texts_to_embed))
+
+    result = []
+    for chunk, slot in zip(chunks, chunk_slots):
+        values, scale = vectors[slot]
+        result.append(ChunkWithEmbedding(**vars(chunk), embedding=values, scale=scale))
+
+    if stable_batch_size < batch_size:
+        print(
+            f"Embedding batch size reduced to {stable_batch_size}; "
+            f"set embed_batch_size: {stable_batch_size} in bookrag.yaml to skip retries."
+        )
 
     return result
 
@@ -137,7 +589,7 @@ def check_ollama_available(base_url: str = "http://localhost:11434") -> bool:
         True if Ollama is running, False otherwise
     """
     try:
-        response = requests.get(f"{base_url}/api/tags", timeout=5)
+        response = _SESSION.get(f"{base_url}/api/tags", timeout=5)
         return response.ok
     except (requests.ConnectionError, requests.Timeout):
         return False
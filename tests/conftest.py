@@ -0,0 +1,112 @@
+"""Shared pytest fixtures and hooks."""
+import mmap
+import os
+import shutil
+import pytest
+import subprocess
+from pathlib import Path
+from unittest.mock import patch
+
+FIXTURES = (Path(__file__).parent / "fixtures").resolve()
+SAMPLE_BOOK = FIXTURES / "sample-book"
+
+
+def pytest_configure(config):
+    """Register custom markers."""
+    config.addinivalue_line("markers", "requires_pandoc: skip the test if pandoc is not installed")
+
+
+def pytest_collection_modifyitems(config, items):
+    """Skip requires_pandoc tests, looking up pandoc once per session."""
+    marked = [item for item in items if item.get_closest_marker("requires_pandoc")]
+    if not marked or shutil.which("pandoc") is not None:
+        return
+
+    skip_pandoc = pytest.mark.skip(reason="pandoc not installed")
+    for item in marked:
+        item.add_marker(skip_pandoc)
+
+
+@pytest.fixture
+def no_pandoc(monkeypatch):
+    """Make every subprocess.run call fail as if pandoc were not installed."""
+    def mock_run(*args, **kwargs):
+        raise FileNotFoundError("pandoc not found")
+
+    monkeypatch.setattr(subprocess, "run", mock_run)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def isolated_cache_home(tmp_path_factory):
+    """Keep every cache written by tests (config, embeddings, Jinja) out of ~/.cache.
+
+    bookrag resolves cache directories when it first uses them, not at
+    import, so setting XDG_CACHE_HOME here covers all of them.
+    """
+    previous = os.environ.get("XDG_CACHE_HOME")
+    os.environ["XDG_CACHE_HOME"] = str(tmp_path_factory.mktemp("cache"))
+    yield
+    if previous is None:
+        del os.environ["XDG_CACHE_HOME"]
+    else:
+        os.environ["XDG_CACHE_HOME"] = previous
+
+
+@pytest.fixture(scope="session")
+def embedded_chunks():
+    """Chunks with embeddings to stand in for generate_embeddings output."""
+    from bookrag.embeddings import ChunkWithEmbedding
+
+    return [
+        ChunkWithEmbedding(
+            id="intro-1",
+            chapter_id="intro",
+            heading="Introduction",
+            content="Test content",
+            token_count=10,
+            embedding=[0.1, 0.2, 0.3]
+        )
+    ]
+
+
+@pytest.fixture
+def mock_embed(embedded_chunks):
+    """Patch generate_embeddings in the builder to return embedded_chunks."""
+    with patch('bookrag.builder.generate_embeddings', return_value=embedded_chunks) as mock:
+        yield mock
+
+
+@pytest.fixture
+def mock_pandoc():
+    """Patch pandoc conversion to return HTML for the sample book's two chapters."""
+    with patch('bookrag.builder.convert_all_markdown_to_html', return_value=["<p>a</p>", "<p>b</p>"]) as mock:
+        yield mock
+
+
+@pytest.fixture(scope="session")
+def built_sample_book(tmp_path_factory, isolated_cache_home, embedded_chunks):
+    """Build the sample book once with mocked embeddings; returns the HTML path.
+
+    Tests using it must be marked requires_pandoc.
+    """
+    from bookrag.builder import build_book
+
+    output_file = tmp_path_factory.mktemp("sample-book") / "output.html"
+
+    with patch('bookrag.builder.generate_embeddings', return_value=embedded_chunks):
+        build_book(SAMPLE_BOOK, output_file)
+
+    return output_file
+
+
+@pytest.fixture(scope="session")
+def built_sample_book_html(built_sample_book):
+    """Memory-map the built sample book's HTML as read-only bytes.
+
+    Lets tests search the output with bytes patterns without reading and
+    decoding the whole file into a str.
+    """
+    with open(built_sample_book, 'rb') as f:
+        html = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    yield html
+    html.close()
@@ -1,6 +1,13 @@
+import os
 import pytest
+import subprocess
+import sys
 from pathlib import Path
-from bookrag.builder import generate_toc
+import json
+import bookrag.builder
+from bookrag.builder import (
+    generate_toc, convert_all_markdown_to_html, convert_markdown_to_html, dumps_json
+)
 
 def test_generate_toc():
     """Test TOC HTML generation from chapters config."""
@@ -16,3 +23,138 @@ def test_generate_toc():
     assert 'Introduction' in toc_html
     assert 'data-chapter-id="chapter1"' in toc_html
     assert 'Chapter 1' in toc_html
+
+def test_convert_all_markdown_splits_single_pandoc_run(monkeypatch):
+    """Test chapters are converted in one pandoc run and split back apart."""
+    chapters = ["Chapter one", "Chapter two", "Chapter three"]
+    calls = []
+
+    def fake_run(cmd, input=None, **kwargs):
+        calls.append(cmd)
+        return subprocess.CompletedProcess(cmd, 0, stdout=f"<p>{input}</p>\n")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+
+    html = convert_all_markdown_to_html(chapters)
+
+    assert len(calls) == 1
+    assert len(html) == 3
+    assert "Chapter one" in html[0]
+    assert "Chapter two" in html[1]
+    assert "Chapter three" in html[2]
+    assert all("BOOKRAG_SPLIT" not in part for part in html)
+
+
+def test_convert_all_markdown_falls_back_on_sentinel_mismatch(monkeypatch):
+    """Test per-chapter conversion when the sentinel is lost."""
+    def fake_run(cmd, input=None, **kwargs):
+        if "BOOKRAG_SPLIT" in input:
+            return subprocess.CompletedProcess(cmd, 0, stdout="<p>merged</p>\n")
+        return subprocess.CompletedProcess(cmd, 0, stdout=f"<p>{input}</p>\n")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+
+    html = convert_all_markdown_to_html(["Chapter one", "Chapter two"])
+
+    assert html == ["<p>Chapter one</p>\n", "<p>Chapter two</p>\n"]
+
+
+def test_convert_all_markdown_footnotes_convert_per_chapter(monkeypatch):
+    """Test chapters with footnotes skip the combined pandoc run."""
+    inputs = []
+
+    def fake_run(cmd, input=None, **kwargs):
+        inputs.append(input)
+        return subprocess.CompletedProcess(cmd, 0, stdout=f"<p>{input}</p>\n")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+
+    convert_all_markdown_to_html(["See note[^1].\n\n[^1]: Note.", "Chapter two"])
+
+    assert len(inputs) == 2
+    assert not any("BOOKRAG_SPLIT" in text for text in inputs)
+
+
+@pytest.mark.parametrize("chapter", [
+    "See note^[An inline note.].",
+    "See [x][1].\n\n[1]: https://example.com/one",
+    "See [the docs].\n\n   [the docs]: https://example.com/docs \"Docs\"",
+], ids=["inline-note", "numbered-reference", "named-reference"])
+def test_convert_all_markdown_document_scoped_syntax_converts_per_chapter(monkeypatch, chapter):
+    """Test inline notes and reference definitions skip the combined pandoc run."""
+    inputs = []
+
+    def fake_run(cmd, input=None, **kwargs):
+        inputs.append(input)
+        return subprocess.CompletedProcess(cmd, 0, stdout=f"<p>{input}</p>\n")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+
+    convert_all_markdown_to_html([chapter, "Chapter two"])
+
+    assert len(inputs) == 2
+    assert not any("BOOKRAG_SPLIT" in text for text in inputs)
+
+
+@pytest.mark.parametrize("second", [
+    "## Summary\n\nMore.",
+    "## Summary ##\n\nMore.",
+    "Summary!\n-------\n\nMore.",
+], ids=["atx", "closed-atx", "setext"])
+def test_convert_all_markdown_shared_heading_ids_convert_per_chapter(monkeypatch, second):
+    """Test chapters with colliding heading identifiers keep per-chapter anchors."""
+    inputs = []
+
+    def fake_run(cmd, input=None, **kwargs):
+        inputs.append(input)
+        return subprocess.CompletedProcess(cmd, 0, stdout=f"<p>{input}</p>\n")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+
+    convert_all_markdown_to_html(["## Summary\n\nText.", second])
+
+    assert len(inputs) == 2
+    assert not any("BOOKRAG_SPLIT" in text for text in inputs)
+
+
+def test_convert_all_markdown_distinct_headings_share_pandoc_run(monkeypatch):
+    """Test ordinary chapters with distinct headings still use one pandoc run."""
+    inputs = []
+
+    def fake_run(cmd, input=None, **kwargs):
+        inputs.append(input)
+        return subprocess.CompletedProcess(cmd, 0, stdout=f"<p>{input}</p>\n")
+
+    monkeypatch.setattr(subprocess, "run", fake_run)
+
+    convert_all_markdown_to_html(["## Intro\n\nSee [a](https://a.example).", "## Summary\n\n---\n"])
+
+    assert len(inputs) == 1
+
+
+def test_dumps_json_without_orjson(monkeypatch):
+    """Test stdlib fallback produces the same JSON as orjson."""
+    data = [{"id": "intro-1", "heading": "Café", "embedding": [0.1, -0.25]}]
+    with_orjson = dumps_json(data)
+
+    monkeypatch.setattr(bookrag.builder, "orjson", None)
+    without_orjson = dumps_json(data)
+
+    assert json.loads(without_orjson) == data
+    assert json.loads(with_orjson) == data
+
+def test_convert_markdown_without_pandoc(no_pandoc):
+    """Test a missing pandoc binary is reported with install instructions."""
+    with pytest.raises(FileNotFoundError, match="Pandoc not found"):
+        convert_markdown_to_html("# Title")
+
+def test_import_does_not_create_cache_dir(tmp_path):
+    """Test the Jinja bytecode cache is only created when rendering."""
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path))
+    result = subprocess.run(
+        [sys.executable, "-c", "import bookrag.builder"],
+        capture_output=True, text=True, cwd=Path(__file__).parent.parent, env=env
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert not (tmp_path / "bookrag").exists()
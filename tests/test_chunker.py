@@ -1,16 +1,46 @@
 """Tests for the chunker module."""
 import pytest
+from unittest.mock import Mock
+import bookrag.chunker
 from bookrag.chunker import chunk_markdown, estimate_tokens, Chunk
 
 
-def test_estimate_tokens():
+def test_estimate_tokens(monkeypatch):
     """Test token estimation."""
+    monkeypatch.setattr("bookrag.chunker._get_encoder", lambda: None)
     # ~4 chars per token
     assert estimate_tokens("hello world") == 2  # 11 chars -> 2 tokens
     assert estimate_tokens("") == 0
     assert estimate_tokens("a" * 100) == 25  # 100 chars -> 25 tokens
 
 
+def test_estimate_tokens_uses_encoder(monkeypatch):
+    """Test exact counts come from the tokenizer when available."""
+    encoder = Mock()
+    encoder.encode.return_value = [1, 2, 3]
+    monkeypatch.setattr("bookrag.chunker._get_encoder", lambda: encoder)
+
+    assert estimate_tokens("hello world") == 3
+
+
+def test_get_encoder_skips_uncached_encoding(monkeypatch, tmp_path, capsys):
+    """Test tiktoken is not asked to download the encoding during a build."""
+    fake_tiktoken = Mock()
+    monkeypatch.setattr(bookrag.chunker, "tiktoken", fake_tiktoken)
+    monkeypatch.setenv("TIKTOKEN_CACHE_DIR", str(tmp_path))
+    bookrag.chunker._get_encoder.cache_clear()
+    try:
+        assert bookrag.chunker._get_encoder() is None
+        fake_tiktoken.get_encoding.assert_not_called()
+        assert "not cached" in capsys.readouterr().out
+
+        bookrag.chunker._tiktoken_cache_file().write_bytes(b"cached")
+        bookrag.chunker._get_encoder.cache_clear()
+        assert bookrag.chunker._get_encoder() is fake_tiktoken.get_encoding.return_value
+    finally:
+        bookrag.chunker._get_encoder.cache_clear()
+
+
 def test_chunk_simple_content():
     """Test chunking content without headings."""
     content = "This is a simple paragraph.\n\nThis is another paragraph."
@@ -138,3 +168,30 @@ def test_chunk_dataclass():
     assert chunk.heading == "Test Heading"
     assert chunk.content == "Test content"
     assert chunk.token_count == 10
+
+
+def test_chunk_ignores_deeper_headings():
+    """Test #### headings stay in the enclosing section."""
+    content = """## Section
+Intro text.
+
+#### Detail
+Detail text.
+"""
+    chunks = chunk_markdown(content, "test")
+
+    assert len(chunks) == 1
+    assert chunks[0].heading == "Section"
+    assert "#### Detail" in chunks[0].content
+
+
+def test_chunk_empty_heading_section_dropped():
+    """Test headings without content produce no chunk."""
+    content = """## Empty
+
+## Filled
+Some text.
+"""
+    chunks = chunk_markdown(content, "test")
+
+    assert [c.heading for c in chunks] == ["Filled"]
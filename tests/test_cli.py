@@ -1,51 +1,74 @@
-import shutil
+import subprocess
+import sys
 import pytest
+from pathlib import Path
 from click.testing import CliRunner
 from bookrag.cli import cli
 
-# Check if pandoc is installed
-PANDOC_AVAILABLE = shutil.which("pandoc") is not None
+FIXTURES = (Path(__file__).parent / "fixtures").resolve()
+SAMPLE_BOOK = FIXTURES / "sample-book"
 
 
-def test_cli_help():
+@pytest.fixture(scope="module")
+def runner():
+    """Share one Click test runner across the module."""
+    return CliRunner()
+
+
+def test_cli_help(runner):
     """Test that CLI help works."""
-    runner = CliRunner()
-    result = runner.invoke(cli, ['--help'])
+    result = runner.invoke(cli, ['--help'], standalone_mode=False)
 
     assert result.exit_code == 0
     assert 'bookrag' in result.output.lower()
     assert 'build' in result.output.lower()
 
-def test_build_command_requires_args():
+def test_build_help_lists_gzip_option(runner):
+    """Test build command documents the chunk compression flag."""
+    result = runner.invoke(cli, ['build', '--help'], standalone_mode=False)
+
+    assert result.exit_code == 0
+    assert '--no-gzip' in result.output
+
+def test_cli_import_is_lightweight():
+    """Test importing the CLI does not pull in the build pipeline."""
+    code = (
+        "import sys, bookrag.cli; "
+        "assert 'bookrag.builder' not in sys.modules; "
+        "assert 'requests' not in sys.modules"
+    )
+    repo_root = Path(__file__).parent.parent
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, cwd=repo_root
+    )
+
+    assert result.returncode == 0, result.stderr
+
+def test_build_command_requires_args(runner):
     """Test that build command requires source and output args."""
-    runner = CliRunner()
     result = runner.invoke(cli, ['build'])
 
     assert result.exit_code != 0
     assert 'Missing argument' in result.output or 'Usage:' in result.output
 
-@pytest.mark.skipif(not PANDOC_AVAILABLE, reason="pandoc not installed")
-def test_build_command_success(tmp_path):
+@pytest.mark.requires_pandoc
+def test_build_command_success(runner, tmp_path):
     """Test successful build via CLI."""
-    from pathlib import Path
-
-    source_dir = Path(__file__).parent / "fixtures" / "sample-book"
+    source_dir = SAMPLE_BOOK
     output_file = tmp_path / "output.html"
 
-    runner = CliRunner()
     result = runner.invoke(cli, ['build', str(source_dir), str(output_file)])
 
     assert result.exit_code == 0
     assert 'successfully' in result.output.lower()
     assert output_file.exists()
 
-def test_build_command_missing_config(tmp_path):
+def test_build_command_missing_config(runner, tmp_path):
     """Test error handling for missing config."""
     source_dir = tmp_path / "no-config"
     source_dir.mkdir()
     output_file = tmp_path / "output.html"
 
-    runner = CliRunner()
     result = runner.invoke(cli, ['build', str(source_dir), str(output_file)])
 
     assert result.exit_code != 0
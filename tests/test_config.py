@@ -1,10 +1,14 @@
 import pytest
 from pathlib import Path
-from bookrag.config import load_config
+from unittest.mock import patch
+import bookrag.config
+from bookrag.config import load_config, get_cache_dir
+
+FIXTURES = (Path(__file__).parent / "fixtures").resolve()
 
 def test_load_valid_config():
     """Test loading a valid config file."""
-    config_path = Path(__file__).parent / "fixtures" / "valid-config.yaml"
+    config_path = FIXTURES / "valid-config.yaml"
     config = load_config(config_path)
 
     assert config["title"] == "Test Book"
@@ -19,7 +23,7 @@ def test_load_valid_config():
 
 def test_load_minimal_config():
     """Test loading config with minimal required fields."""
-    config_path = Path(__file__).parent / "fixtures" / "minimal-config.yaml"
+    config_path = FIXTURES / "minimal-config.yaml"
     config = load_config(config_path)
 
     assert config["title"] == "Minimal Book"
@@ -29,10 +33,18 @@ def test_load_minimal_config():
 
 def test_missing_required_fields():
     """Test that missing title raises error."""
-    config_path = Path(__file__).parent / "fixtures" / "invalid-config.yaml"
+    config_path = FIXTURES / "invalid-config.yaml"
     with pytest.raises(ValueError, match="Missing required field: title"):
         load_config(config_path)
 
+def test_load_config_utf8(tmp_path):
+    """Test non-ASCII config values are decoded as UTF-8."""
+    config_path = tmp_path / "bookrag.yaml"
+    base = (FIXTURES / "minimal-config.yaml").read_text()
+    config_path.write_bytes(base.replace("Minimal Book", "Café Ñandú").encode("utf-8"))
+
+    assert load_config(config_path)["title"] == "Café Ñandú"
+
 def test_missing_model_field(tmp_path):
     """Test that missing model raises error."""
     config_content = """title: "Test"
@@ -48,3 +60,106 @@ chapters:
 
     with pytest.raises(ValueError, match="Missing required field: model"):
         load_config(config_path)
+
+def test_embed_batch_size_default():
+    """Test embed_batch_size defaults when omitted."""
+    config_path = FIXTURES / "minimal-config.yaml"
+    config = load_config(config_path)
+
+    assert config["embed_batch_size"] == 32
+
+def test_embed_batch_size_clamped(tmp_path):
+    """Test embed_batch_size is clamped to 1..512."""
+    config_path = tmp_path / "bookrag.yaml"
+    base = (FIXTURES / "minimal-config.yaml").read_text()
+
+    config_path.write_text(base + "embed_batch_size: 4096\n")
+    assert load_config(config_path)["embed_batch_size"] == 512
+
+    config_path.write_text(base + "embed_batch_size: 0\n")
+    assert load_config(config_path)["embed_batch_size"] == 1
+
+def test_embed_batch_size_invalid(tmp_path):
+    """Test non-integer embed_batch_size raises error."""
+    config_path = tmp_path / "bookrag.yaml"
+    base = (FIXTURES / "minimal-config.yaml").read_text()
+    config_path.write_text(base + "embed_batch_size: lots\n")
+
+    with pytest.raises(ValueError, match="embed_batch_size"):
+        load_config(config_path)
+
+def test_get_cache_dir_honors_xdg(tmp_path, monkeypatch):
+    """Test cache directory lives under XDG_CACHE_HOME."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+
+    assert get_cache_dir("jinja") == tmp_path / "bookrag" / "jinja"
+
+def test_quantize_invalid(tmp_path):
+    """Test unknown quantize mode raises error."""
+    config_path = tmp_path / "bookrag.yaml"
+    base = (FIXTURES / "minimal-config.yaml").read_text()
+    config_path.write_text(base + "quantize: int4\n")
+
+    with pytest.raises(ValueError, match="quantize"):
+        load_config(config_path)
+
+def test_load_config_cached_until_file_changes(tmp_path):
+    """Test unchanged files are served from cache and edits are picked up."""
+    config_path = tmp_path / "bookrag.yaml"
+    base = (FIXTURES / "minimal-config.yaml").read_text()
+    config_path.write_text(base)
+
+    with patch("bookrag.config._parse_config", wraps=bookrag.config._parse_config) as mock_parse:
+        first = load_config(config_path)
+        first["title"] = "Mutated"
+        second = load_config(config_path)
+
+        assert mock_parse.call_count == 1
+        assert second["title"] == "Minimal Book"
+
+        config_path.write_text(base.replace("Minimal Book", "Edited Book"))
+        assert load_config(config_path)["title"] == "Edited Book"
+        assert mock_parse.call_count == 2
+
+
+def test_load_config_reuses_disk_cache_across_processes(tmp_path, monkeypatch):
+    """Test a validated config is read back from disk when not cached in memory."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config_path = tmp_path / "bookrag.yaml"
+    config_path.write_text((FIXTURES / "minimal-config.yaml").read_text())
+
+    with patch("bookrag.config._parse_config", wraps=bookrag.config._parse_config) as mock_parse:
+        load_config(config_path)
+        # Simulate a new process: only the in-memory cache is lost
+        bookrag.config._CONFIG_CACHE.clear()
+        assert load_config(config_path)["title"] == "Minimal Book"
+        assert mock_parse.call_count == 1
+        assert list((tmp_path / "cache" / "bookrag" / "config").glob("*.json"))
+
+
+def test_load_config_disk_cache_keyed_by_resolved_path(tmp_path, monkeypatch):
+    """Test relative and absolute paths to the same file share a cache entry."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "bookrag.yaml"
+    config_path.write_text((FIXTURES / "minimal-config.yaml").read_text())
+
+    with patch("bookrag.config._parse_config", wraps=bookrag.config._parse_config) as mock_parse:
+        load_config(Path("bookrag.yaml"))
+        bookrag.config._CONFIG_CACHE.clear()
+        load_config(config_path)
+        assert mock_parse.call_count == 1
+
+
+def test_load_config_ignores_corrupt_disk_cache(tmp_path, monkeypatch):
+    """Test an undecodable cache file is treated as a miss."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    config_path = tmp_path / "bookrag.yaml"
+    config_path.write_text((FIXTURES / "minimal-config.yaml").read_text())
+    load_config(config_path)
+    bookrag.config._CONFIG_CACHE.clear()
+    cache_files = list((tmp_path / "cache" / "bookrag" / "config").glob("*.json"))
+    assert cache_files
+    cache_files[0].write_bytes(b"\x80not json")
+
+    assert load_config(config_path)["title"] == "Minimal Book"
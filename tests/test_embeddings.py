@@ -5,12 +5,25 @@ from bookrag.chunker import Chunk
 from bookrag.embeddings import (
     generate_embedding,
     generate_embeddings,
+    generate_embeddings_batch,
     check_ollama_available,
     ChunkWithEmbedding,
-    OllamaConnectionError
+    OllamaConnectionError,
+    OllamaOverloadedError,
+    normalize_embedding,
+    content_hash,
+    load_embedding_cache,
+    pack_chunks,
+    quantize_embedding,
+    read_cached_embedding
 )
 
 
+def one_hot(index, dim=8):
+    """Build a unit vector with a single non-zero component."""
+    return [1.0 if i == index else 0.0 for i in range(dim)]
+
+
 def test_chunk_with_embedding_to_dict():
     """Test ChunkWithEmbedding serialization."""
     chunk = ChunkWithEmbedding(
@@ -27,9 +40,178 @@ def test_chunk_with_embedding_to_dict():
     assert d["embedding"] == [0.1, 0.2, 0.3]
 
 
+def test_chunk_with_embedding_to_dict_includes_scale():
+    """Test scale is serialized only for quantized embeddings."""
+    chunk = ChunkWithEmbedding(
+        id="test-1", chapter_id="test", heading="Test", content="Test content",
+        token_count=10, embedding=[127, -64], scale=0.01
+    )
+
+    assert chunk.to_dict()["scale"] == 0.01
+
+
+def test_pack_chunks_float32_roundtrip():
+    """Test packed embeddings decode back to the original vectors."""
+    import base64
+    import struct
+
+    chunks = [
+        ChunkWithEmbedding(id="a-1", chapter_id="a", heading="A", content="One",
+                           token_count=1, embedding=[0.5, -0.25]),
+        ChunkWithEmbedding(id="a-2", chapter_id="a", heading="B", content="Two",
+                           token_count=1, embedding=[1.0, 2.0]),
+    ]
+
+    packed = pack_chunks(chunks)
+
+    assert packed["dim"] == 2
+    assert packed["dtype"] == "float32"
+    assert packed["chunks"][0] == {
+        "id": "a-1", "chapter_id": "a", "heading": "A", "content": "One",
+        "content_hash": content_hash("One"), "token_count": 1
+    }
+    raw = base64.b64decode(packed["embeddings"])
+    assert struct.unpack("<4f", raw) == (0.5, -0.25, 1.0, 2.0)
+
+
+def test_pack_chunks_int8_keeps_scale():
+    """Test int8 packing stores one byte per value and per-chunk scales."""
+    import base64
+
+    values, scale = quantize_embedding([0.6, -0.8], "int8")
+    chunk = ChunkWithEmbedding(id="a-1", chapter_id="a", heading="", content="x",
+                               token_count=1, embedding=values, scale=scale)
+
+    packed = pack_chunks([chunk], "int8")
+
+    assert packed["dtype"] == "int8"
+    assert packed["chunks"][0]["scale"] == scale
+    assert len(base64.b64decode(packed["embeddings"])) == 2
+
+
+def test_pack_chunks_rejects_mixed_dimensions():
+    """Test embeddings of different lengths cannot be packed together."""
+    chunks = [
+        ChunkWithEmbedding(id="a-1", chapter_id="a", heading="", content="x",
+                           token_count=1, embedding=[0.1, 0.2]),
+        ChunkWithEmbedding(id="a-2", chapter_id="a", heading="", content="y",
+                           token_count=1, embedding=[0.1]),
+    ]
+
+    with pytest.raises(ValueError, match="dimension"):
+        pack_chunks(chunks)
+
+
+@pytest.mark.parametrize("mode", ["none", "fp16", "int8"])
+def test_load_embedding_cache_roundtrip(mode):
+    """Test packed embeddings are recovered, keyed by content hash."""
+    values, scale = quantize_embedding([0.3, -0.4, 0.5], mode)
+    chunk = ChunkWithEmbedding(id="a-1", chapter_id="a", heading="", content="Hello",
+                               token_count=1, embedding=values, scale=scale)
+    packed = pack_chunks([chunk], mode, "nomic-embed-text")
+
+    cache = load_embedding_cache(packed, "nomic-embed-text", mode)
+
+    cached_values, cached_scale = cache[content_hash("Hello")]
+    # float32 storage rounds away float64 precision; other modes are exact
+    assert cached_values == pytest.approx(values, rel=1e-6)
+    assert cached_scale == scale
+
+
+def test_load_embedding_cache_ignores_other_model():
+    """Test vectors from a different model or precision are not reused."""
+    chunk = ChunkWithEmbedding(id="a-1", chapter_id="a", heading="", content="Hello",
+                               token_count=1, embedding=[1.0, 0.0])
+    packed = pack_chunks([chunk], "none", "nomic-embed-text")
+
+    assert load_embedding_cache(packed, "mxbai-embed-large", "none") == {}
+    assert load_embedding_cache(packed, "nomic-embed-text", "fp16") == {}
+    assert load_embedding_cache([], "nomic-embed-text", "none") == {}
+
+
+def test_generate_embeddings_reuses_cached_vectors():
+    """Test cached chunks skip Ollama and keep their stored vector."""
+    chunks = [
+        Chunk(id="ch1-1", chapter_id="ch1", heading="A", content="Old", token_count=1),
+        Chunk(id="ch1-2", chapter_id="ch1", heading="B", content="New", token_count=1),
+    ]
+    cache = {content_hash("Old"): ([0.0, 1.0], None)}
+
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.return_value = [[1.0, 0.0]]
+
+        result = generate_embeddings(chunks, cache=cache)
+
+        assert mock_embed.call_args[0][0] == ["New"]
+        assert result[0].embedding == [0.0, 1.0]
+        assert list(result[1].embedding) == [1.0, 0.0]
+
+
+def test_generate_embeddings_uses_disk_cache(tmp_path):
+    """Test the on-disk cache saves raw vectors and skips Ollama on later runs."""
+    chunks = [Chunk(id="ch1-1", chapter_id="ch1", heading="A", content="Text", token_count=1)]
+
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.return_value = [[3.0, 4.0]]
+
+        generate_embeddings(chunks, cache_dir=tmp_path)
+        result = generate_embeddings(chunks, cache_dir=tmp_path)
+
+        assert mock_embed.call_count == 1
+        assert result[0].embedding == pytest.approx([0.6, 0.8])
+        assert read_cached_embedding(tmp_path, "nomic-embed-text", "Text") == [3.0, 4.0]
+        assert read_cached_embedding(tmp_path, "other-model", "Text") is None
+
+
+def test_quantize_embedding_none():
+    """Test no quantization only normalizes the vector."""
+    values, scale = quantize_embedding([3.0, 4.0])
+
+    assert values == pytest.approx([0.6, 0.8])
+    assert scale is None
+
+
+def test_normalize_embedding():
+    """Test embeddings are scaled to unit length."""
+    assert normalize_embedding([3.0, 4.0]) == pytest.approx([0.6, 0.8])
+    assert normalize_embedding([0.0, 0.0]) == [0.0, 0.0]
+
+
+def test_quantize_embedding_int8():
+    """Test int8 quantization round-trips within one step."""
+    vector = [0.3, -0.4, 0.0]
+    values, scale = quantize_embedding(vector, "int8")
+
+    assert all(isinstance(v, int) and -127 <= v <= 127 for v in values)
+    assert max(abs(v) for v in values) == 127
+    restored = [v * scale for v in values]
+    assert restored == pytest.approx([0.6, -0.8, 0.0], abs=scale)
+
+
+def test_quantize_embedding_fp16():
+    """Test fp16 quantization rounds to half precision."""
+    values, scale = quantize_embedding([3.0, 4.0], "fp16")
+
+    assert scale is None
+    assert values == pytest.approx([0.6, 0.8], rel=1e-3)
+
+
+def test_quantize_embedding_uses_compact_arrays():
+    """Test quantized values are stored as float32 or int8 arrays."""
+    assert quantize_embedding([3.0, 4.0])[0].typecode == "f"
+    assert quantize_embedding([3.0, 4.0], "fp16")[0].typecode == "f"
+    assert quantize_embedding([3.0, 4.0], "int8")[0].typecode == "b"
+
+
+def test_quantize_embedding_unknown_mode():
+    """Test unknown modes are rejected."""
+    with pytest.raises(ValueError, match="Unknown quantize mode"):
+        quantize_embedding([0.1], "int4")
+
+
 def test_generate_embedding_connection_error():
     """Test error handling when Ollama is not running."""
-    with patch('bookrag.embeddings.requests.post') as mock_post:
+    with patch('bookrag.embeddings._SESSION.post') as mock_post:
         mock_post.side_effect = Exception("Connection refused")
         # Use ConnectionError specifically
         import requests
@@ -41,10 +223,13 @@ def test_generate_embedding_connection_error():
 
 def test_generate_embedding_model_not_found():
     """Test error handling when model is not installed."""
-    with patch('bookrag.embeddings.requests.post') as mock_post:
+    with patch('bookrag.embeddings._SESSION.post') as mock_post:
         mock_response = Mock()
         mock_response.status_code = 404
         mock_response.ok = False
+        mock_response.json.return_value = {
+            "error": 'model "nonexistent-model" not found, try pulling it first'
+        }
         mock_post.return_value = mock_response
 
         with pytest.raises(ValueError, match="not found"):
@@ -53,7 +238,7 @@ def test_generate_embedding_model_not_found():
 
 def test_generate_embedding_success():
     """Test successful embedding generation."""
-    with patch('bookrag.embeddings.requests.post') as mock_post:
+    with patch('bookrag.embeddings._SESSION.post') as mock_post:
         mock_response = Mock()
         mock_response.ok = True
         mock_response.status_code = 200
@@ -73,14 +258,17 @@ def test_generate_embeddings_multiple_chunks():
         Chunk(id="ch1-2", chapter_id="ch1", heading="Methods", content="Content 2", token_count=10),
     ]
 
-    with patch('bookrag.embeddings.generate_embedding') as mock_embed:
-        mock_embed.side_effect = [[0.1, 0.2], [0.3, 0.4]]
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.return_value = [[3.0, 4.0], [0.0, 2.0]]
 
         result = generate_embeddings(chunks)
 
+        mock_embed.assert_called_once()
+        assert mock_embed.call_args[0][0] == ["Content 1", "Content 2"]
+
         assert len(result) == 2
-        assert result[0].embedding == [0.1, 0.2]
-        assert result[1].embedding == [0.3, 0.4]
+        assert result[0].embedding == pytest.approx([0.6, 0.8])
+        assert result[1].embedding == pytest.approx([0.0, 1.0])
         assert result[0].id == "ch1-1"
         assert result[1].id == "ch1-2"
 
@@ -97,17 +285,191 @@ def test_generate_embeddings_with_progress_callback():
     def progress_cb(current, total):
         progress_calls.append((current, total))
 
-    with patch('bookrag.embeddings.generate_embedding') as mock_embed:
-        mock_embed.return_value = [0.1, 0.2]
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.return_value = [[0.1, 0.2]]
 
-        generate_embeddings(chunks, progress_callback=progress_cb)
+        generate_embeddings(chunks, progress_callback=progress_cb, batch_size=1)
 
         assert progress_calls == [(1, 2), (2, 2)]
 
 
+def test_generate_embeddings_batch_success():
+    """Test batched embedding uses a single /api/embed request."""
+    with patch('bookrag.embeddings._SESSION.post') as mock_post:
+        mock_response = Mock()
+        mock_response.ok = True
+        mock_response.status_code = 200
+        mock_response.json.return_value = {"embeddings": [[0.1, 0.2], [0.3, 0.4]]}
+        mock_post.return_value = mock_response
+
+        result = generate_embeddings_batch(["one", "two"])
+
+        assert result == [[0.1, 0.2], [0.3, 0.4]]
+        mock_post.assert_called_once()
+        assert mock_post.call_args[0][0].endswith("/api/embed")
+        assert mock_post.call_args[1]["json"]["input"] == ["one", "two"]
+
+
+def test_generate_embeddings_batch_falls_back_to_single():
+    """Test fallback to per-text requests when /api/embed has no embeddings."""
+    with patch('bookrag.embeddings._SESSION.post') as mock_post, \
+         patch('bookrag.embeddings.generate_embedding') as mock_single:
+        mock_response = Mock()
+        mock_response.ok = True
+        mock_response.status_code = 200
+        mock_response.json.return_value = {}
+        mock_post.return_value = mock_response
+        mock_single.side_effect = [[0.1], [0.2]]
+
+        result = generate_embeddings_batch(["one", "two"])
+
+        assert result == [[0.1], [0.2]]
+        assert mock_single.call_count == 2
+
+
+def test_generate_embeddings_batch_falls_back_without_embed_endpoint():
+    """Test servers answering /api/embed with a plain 404 use per-text requests."""
+    with patch('bookrag.embeddings._SESSION.post') as mock_post, \
+         patch('bookrag.embeddings.generate_embedding') as mock_single:
+        mock_response = Mock()
+        mock_response.ok = False
+        mock_response.status_code = 404
+        mock_response.text = "404 page not found"
+        mock_response.json.side_effect = ValueError("not JSON")
+        mock_post.return_value = mock_response
+        mock_single.side_effect = [[0.1], [0.2]]
+
+        result = generate_embeddings_batch(["one", "two"])
+
+        assert result == [[0.1], [0.2]]
+        assert mock_single.call_count == 2
+
+
+def test_generate_embeddings_batch_model_not_found():
+    """Test a missing model on /api/embed still asks the user to pull it."""
+    with patch('bookrag.embeddings._SESSION.post') as mock_post, \
+         patch('bookrag.embeddings.generate_embedding') as mock_single:
+        mock_response = Mock()
+        mock_response.ok = False
+        mock_response.status_code = 404
+        mock_response.json.return_value = {
+            "error": 'model "nomic-embed-text" not found, try pulling it first'
+        }
+        mock_post.return_value = mock_response
+
+        with pytest.raises(ValueError, match="ollama pull nomic-embed-text"):
+            generate_embeddings_batch(["one"])
+        mock_single.assert_not_called()
+
+
+def test_generate_embeddings_splits_into_batches():
+    """Test chunks are sent in batch_size slices."""
+    chunks = [
+        Chunk(id=f"ch1-{i}", chapter_id="ch1", heading="", content=f"C{i}", token_count=1)
+        for i in range(5)
+    ]
+
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.side_effect = lambda texts, *args: [[0.0]] * len(texts)
+
+        result = generate_embeddings(chunks, batch_size=2)
+
+        assert [list(c.embedding) for c in result] == [[0.0]] * 5
+        assert sorted(len(c[0][0]) for c in mock_embed.call_args_list) == [1, 2, 2]
+
+
+def test_generate_embeddings_partial_last_batch_keeps_batch_size(capsys):
+    """Test a short final batch is not reported as a batch size reduction."""
+    chunks = [
+        Chunk(id=f"ch1-{i}", chapter_id="ch1", heading="", content=f"C{i}", token_count=1)
+        for i in range(33)
+    ]
+
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.side_effect = lambda texts, *args: [one_hot(0)] * len(texts)
+
+        generate_embeddings(chunks, batch_size=32)
+
+    assert capsys.readouterr().out == ""
+
+
+def test_generate_embeddings_concurrent_batches_keep_order():
+    """Test out-of-order batch completion still yields chunk order."""
+    import threading
+    import time
+
+    chunks = [
+        Chunk(id=f"ch1-{i}", chapter_id="ch1", heading="", content=f"C{i}", token_count=1)
+        for i in range(8)
+    ]
+    first_batch_seen = threading.Event()
+
+    def fake_batch(texts, *args):
+        if texts[0] == "C0":
+            first_batch_seen.set()
+            time.sleep(0.05)
+        return [one_hot(int(t[1:])) for t in texts]
+
+    with patch('bookrag.embeddings.generate_embeddings_batch', side_effect=fake_batch):
+        result = generate_embeddings(chunks, batch_size=2, max_concurrency=4)
+
+    assert first_batch_seen.is_set()
+    assert [list(c.embedding) for c in result] == [one_hot(i) for i in range(8)]
+
+
+def test_generate_embeddings_deduplicates_content():
+    """Test identical chunk contents are embedded once and fanned out."""
+    chunks = [
+        Chunk(id="ch1-1", chapter_id="ch1", heading="A", content="License text", token_count=3),
+        Chunk(id="ch1-2", chapter_id="ch1", heading="B", content="Unique", token_count=2),
+        Chunk(id="ch2-1", chapter_id="ch2", heading="A", content="License text", token_count=3),
+    ]
+
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.return_value = [one_hot(0), one_hot(1)]
+
+        result = generate_embeddings(chunks)
+
+        assert mock_embed.call_args[0][0] == ["License text", "Unique"]
+        assert [c.id for c in result] == ["ch1-1", "ch1-2", "ch2-1"]
+        assert list(result[0].embedding) == list(result[2].embedding) == one_hot(0)
+        assert list(result[1].embedding) == one_hot(1)
+
+
+def test_generate_embeddings_halves_batch_on_overload():
+    """Test an overloaded batch is split and later batches use the smaller size."""
+    chunks = [
+        Chunk(id=f"ch1-{i}", chapter_id="ch1", heading="", content=f"C{i}", token_count=1)
+        for i in range(6)
+    ]
+
+    def fake_batch(texts, *args):
+        if len(texts) > 2:
+            raise OllamaOverloadedError("timeout")
+        return [one_hot(int(t[1:])) for t in texts]
+
+    with patch('bookrag.embeddings.generate_embeddings_batch', side_effect=fake_batch) as mock_embed:
+        result = generate_embeddings(chunks, batch_size=4, max_concurrency=1)
+
+    assert [list(c.embedding) for c in result] == [one_hot(i) for i in range(6)]
+    sizes = [len(c[0][0]) for c in mock_embed.call_args_list]
+    assert sizes == [4, 2, 2, 2]
+
+
+def test_generate_embeddings_overload_single_text_raises():
+    """Test overload on a single-text batch is surfaced."""
+    chunks = [Chunk(id="ch1-1", chapter_id="ch1", heading="", content="C", token_count=1)]
+
+    with patch('bookrag.embeddings.generate_embeddings_batch') as mock_embed:
+        mock_embed.side_effect = OllamaOverloadedError("timeout")
+
+        with pytest.raises(OllamaOverloadedError):
+            generate_embeddings(chunks)
+
+
 def test_check_ollama_available_success():
     """Test Ollama availability check when running."""
-    with patch('bookrag.embeddings.requests.get') as mock_get:
+    with patch('bookrag.embeddings._SESSION.get') as mock_get:
         mock_response = Mock()
         mock_response.ok = True
         mock_get.return_value = mock_response
@@ -117,7 +479,7 @@ def test_check_ollama_available_success():
 
 def test_check_ollama_available_not_running():
     """Test Ollama availability check when not running."""
-    with patch('bookrag.embeddings.requests.get') as mock_get:
+    with patch('bookrag.embeddings._SESSION.get') as mock_get:
         import requests
         mock_get.side_effect = requests.ConnectionError()
 
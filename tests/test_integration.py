@@ -1,86 +1,127 @@
+import gzip
+import json
+import os
 import pytest
+import re
+import requests
 import shutil
-import subprocess
 from pathlib import Path
-from unittest.mock import patch, Mock
+from unittest.mock import patch
 from bookrag.builder import build_book
+from bookrag.embeddings import content_hash
 
-# Check if pandoc is installed
-PANDOC_AVAILABLE = shutil.which("pandoc") is not None
+FIXTURES = (Path(__file__).parent / "fixtures").resolve()
+SAMPLE_BOOK = FIXTURES / "sample-book"
 
 
-@pytest.mark.skipif(not PANDOC_AVAILABLE, reason="pandoc not installed")
-def test_build_sample_book(tmp_path: Path) -> None:
-    """Test building complete book from sample fixture."""
-    source_dir = Path(__file__).parent / "fixtures" / "sample-book"
-    output_file = tmp_path / "output.html"
+# Strings the sample book's HTML must contain
+SAMPLE_BOOK_NEEDLES = [
+    b'<title>Sample Book</title>',
+    b'Introduction',
+    b'Chapter 1',
+    b'This is the introduction chapter',
+    # Always 3-column layout with chat (AI is mandatory)
+    b'class="book-container"',
+    b'chat-widget',
+    b'AI Assistant',
+    b'chapter-intro',
+    b'chapter-chapter1',
+    # Ollama config and chunks are embedded
+    b'llama3.2',
+    b'localhost:11434',
+    b'CHUNKS',
+]
+# One alternation, longest first, so the HTML is scanned in a single pass
+SAMPLE_BOOK_PATTERN = re.compile(
+    b"|".join(map(re.escape, sorted(SAMPLE_BOOK_NEEDLES, key=len, reverse=True)))
+)
+
+
+@pytest.mark.requires_pandoc
+def test_build_sample_book_writes_compressed_chunks(built_sample_book: Path) -> None:
+    """Test building the sample book writes gzip-compressed chunks."""
+    # Verify output exists
+    assert built_sample_book.exists()
 
-    # Mock Ollama availability and embedding generation
-    with patch('bookrag.builder.check_ollama_available', return_value=True), \
-         patch('bookrag.builder.generate_embeddings') as mock_embed:
-        # Return mock chunks with embeddings
-        mock_embed.return_value = [
-            Mock(to_dict=lambda: {
-                "id": "intro-1",
-                "chapter_id": "intro",
-                "heading": "Introduction",
-                "content": "Test content",
-                "token_count": 10,
-                "embedding": [0.1, 0.2, 0.3]
-            })
-        ]
+    # Verify compressed chunks were created
+    chunks_file = built_sample_book.parent / "chunks.json.gz"
+    assert chunks_file.exists()
+    with gzip.open(chunks_file, 'rt') as f:
+        assert json.load(f)["chunks"][0]["id"] == "intro-1"
+    assert not (built_sample_book.parent / "chunks.json").exists()
 
-        build_book(source_dir, output_file)
 
-    # Verify output exists
-    assert output_file.exists()
+@pytest.mark.requires_pandoc
+def test_build_sample_book_html(built_sample_book_html) -> None:
+    """Test building complete book from sample fixture."""
+    found = set(SAMPLE_BOOK_PATTERN.findall(built_sample_book_html))
+    assert set(SAMPLE_BOOK_NEEDLES) <= found, set(SAMPLE_BOOK_NEEDLES) - found
+
+
+@pytest.mark.requires_pandoc
+def test_build_sample_book_uncompressed_chunks(tmp_path: Path, mock_embed) -> None:
+    """Test chunks.json is written uncompressed when requested."""
+    build_book(SAMPLE_BOOK, tmp_path / "output.html", compress_chunks=False)
 
-    # Verify chunks.json was created
     chunks_file = tmp_path / "chunks.json"
-    assert chunks_file.exists()
+    assert json.loads(chunks_file.read_text())["dim"] == 3
+    assert not (tmp_path / "chunks.json.gz").exists()
 
-    # Verify HTML content
-    html_content = output_file.read_text()
-    assert '<title>Sample Book</title>' in html_content
-    assert 'Introduction' in html_content
-    assert 'Chapter 1' in html_content
-    assert 'This is the introduction chapter' in html_content
-    # Always 3-column layout with chat (AI is mandatory)
-    assert 'class="book-container"' in html_content
-    assert 'chat-widget' in html_content
-    assert 'AI Assistant' in html_content
-    assert 'chapter-intro' in html_content
-    assert 'chapter-chapter1' in html_content
-    # Verify Ollama config is embedded
-    assert 'llama3.2' in html_content
-    assert 'localhost:11434' in html_content
-    # Verify chunks are embedded
-    assert 'CHUNKS' in html_content
-
-
-def test_pandoc_not_installed(tmp_path: Path, monkeypatch) -> None:
-    """Test graceful error when pandoc not installed."""
-    def mock_run(*args, **kwargs):
-        raise FileNotFoundError("pandoc not found")
 
-    monkeypatch.setattr(subprocess, "run", mock_run)
+def test_rebuild_reuses_up_to_date_chunks(tmp_path: Path, mock_pandoc, mock_embed) -> None:
+    """Test unchanged sources skip embedding and edited ones re-embed."""
+    source_dir = tmp_path / "book"
+    shutil.copytree(SAMPLE_BOOK, source_dir)
+    output_file = tmp_path / "out" / "output.html"
+
+    build_book(source_dir, output_file)
+    build_book(source_dir, output_file)
+    assert mock_embed.call_count == 1
+    assert 'CHUNKS' in output_file.read_text()
+
+    chapter_file = source_dir / "01-intro" / "content.md"
+    chunks_mtime = (tmp_path / "out" / "chunks.json.gz").stat().st_mtime_ns
+    os.utime(chapter_file, ns=(chunks_mtime + 10**9, chunks_mtime + 10**9))
+    build_book(source_dir, output_file)
+    assert mock_embed.call_count == 2
+    # The edited build is offered the previous vectors by content hash
+    cache = mock_embed.call_args.kwargs["cache"]
+    assert content_hash("Test content") in cache
+
+
+def test_rebuild_ignores_chunks_from_another_book(tmp_path: Path, mock_pandoc, mock_embed) -> None:
+    """Test a newer chunks file written by a different book is not reused."""
+    book_a = tmp_path / "book-a"
+    book_b = tmp_path / "book-b"
+    shutil.copytree(SAMPLE_BOOK, book_a)
+    shutil.copytree(SAMPLE_BOOK, book_b)
+    intro_b = book_b / "01-intro" / "content.md"
+    intro_b.write_text(intro_b.read_text() + "\nOnly in book B.\n")
+    os.utime(intro_b, ns=(0, 0))
+    os.utime(book_b / "bookrag.yaml", ns=(0, 0))
+
+    build_book(book_a, tmp_path / "dist" / "a.html")
+    build_book(book_b, tmp_path / "dist" / "b.html")
 
-    source_dir = Path(__file__).parent / "fixtures" / "sample-book"
+    assert mock_embed.call_count == 2
+
+
+def test_pandoc_not_installed(tmp_path: Path, no_pandoc) -> None:
+    """Test graceful error when pandoc not installed."""
+    source_dir = SAMPLE_BOOK
     output_file = tmp_path / "output.html"
 
-    # Mock Ollama availability
-    with patch('bookrag.builder.check_ollama_available', return_value=True):
-        with pytest.raises(FileNotFoundError, match="Pandoc not found"):
-            build_book(source_dir, output_file)
+    with pytest.raises(FileNotFoundError, match="Pandoc not found"):
+        build_book(source_dir, output_file)
 
 
-def test_ollama_not_running(tmp_path: Path) -> None:
+def test_ollama_not_running(tmp_path: Path, mock_pandoc) -> None:
     """Test graceful error when Ollama not running."""
     from bookrag.embeddings import OllamaConnectionError
 
-    source_dir = Path(__file__).parent / "fixtures" / "sample-book"
+    source_dir = SAMPLE_BOOK
     output_file = tmp_path / "output.html"
 
-    with patch('bookrag.builder.check_ollama_available', return_value=False):
+    with patch('bookrag.embeddings._SESSION.post', side_effect=requests.ConnectionError()):
         with pytest.raises(OllamaConnectionError, match="Ollama is not running"):
             build_book(source_dir, output_file)